@@ -0,0 +1,252 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import argparse, json, multiprocessing, resource, sys, time
+
+import OGLCommon
+from OGLCommon import OGLEnum
+from OGLImage import Image2D
+import OGLImageConverter
+from OGLImageConverter import Convert
+from UtilExecutor import FindTool
+from UtilCommon import LazyModule
+
+np = LazyModule('numpy')
+OGLETCCodec = LazyModule('OGLETCCodec')
+
+# Measure the throughput of every converter edge over a matrix of image sizes,
+# content types and encoder effort levels, every case runs in a fresh worker process so that its
+# peak memory and the time spent in external tools are measured on their own
+
+SIZES = (64, 256, 1024)
+CONTENTS = ('noise', 'gradient', 'solid')
+
+# external tool needed by the edges of every convert factory
+FACTORY_TOOLS = {
+    OGLImageConverter._ETCImageConverter : OGLImageConverter.ETCPACK_NAME,
+    OGLImageConverter._ASTCImageConverter : OGLImageConverter.ASTCENC_NAME,
+}
+
+# regressions of peak memory below this are noise of the allocator
+MEMORY_NOISE_MB = 1.0
+
+def ListEdges():
+    edges = [(src_format, dst_format)
+        for src_format, dst_formats in OGLImageConverter._converters.items()
+        for dst_format in dst_formats]
+    return sorted(edges, key=lambda edge : GetEdgeName(*edge))
+
+def GetEdgeName(src_format, dst_format):
+    return '{0} -> {1}'.format(OGLEnum.names[src_format], OGLEnum.names[dst_format])
+
+def _GetEdgeFactory(src_format, dst_format):
+    for (src, dst, convert_factory, factory_args) in OGLImageConverter.CONVERTER_TABLE:
+        if (src, dst) == (src_format, dst_format):
+            return convert_factory
+    return None
+
+# name of the tool the edge runs, or None for in-process edges
+def GetEdgeTool(src_format, dst_format):
+    return FACTORY_TOOLS.get(_GetEdgeFactory(src_format, dst_format))
+
+# effort levels an edge is measured with, None stands for the default options
+# (etcpack for ETC edges that have it)
+def ListEfforts(src_format, dst_format):
+    convert_factory = _GetEdgeFactory(src_format, dst_format)
+    if convert_factory is OGLImageConverter._ASTCImageConverter:
+        return list(OGLImageConverter.ASTC_EFFORT_LEVELS)
+    if convert_factory is OGLImageConverter._ETCImageConverter:
+        if dst_format in OGLETCCodec.ETC_ENCODE_FORMATS:
+            return [None] + list(OGLETCCodec.ETC_EFFORT_LEVELS)
+    elif convert_factory is OGLImageConverter._ETCEncoder:
+        return list(OGLETCCodec.ETC_EFFORT_LEVELS)
+    return [None]
+
+def _EffortOptions(src_format, dst_format, effort):
+    if effort is None:
+        return {}
+    if _GetEdgeFactory(src_format, dst_format) is OGLImageConverter._ASTCImageConverter:
+        return {'astc_effort' : effort}
+    return {'etc_effort' : effort}
+
+def _RouteAvailable(src_format, dst_format):
+    route = OGLImageConverter._FindRoute(src_format, dst_format)
+    if route is None:
+        return False
+    for src_node, dest_node in zip(route[:-1], route[1:]):
+        tool = GetEdgeTool(src_node, dest_node)
+        if tool and not FindTool(tool):
+            return False
+    return True
+
+def _MakePixels(width, height, channels, content):
+    if content == 'noise':
+        return np.random.RandomState(0).randint(0, 256, (height, width, channels)).astype(np.uint8)
+    if content == 'gradient':
+        x = np.arange(width) * 255 // max(1, width - 1)
+        y = np.arange(height) * 255 // max(1, height - 1)
+        (x, y) = np.broadcast_arrays(x[None, :], y[:, None])
+        return np.dstack((x, y, (x + y) // 2, 255 - x)[:channels]).astype(np.uint8)
+    pixels = np.empty((height, width, channels), dtype=np.uint8)
+    pixels[:] = (0x40, 0x80, 0xC0, 0xFF)[:channels]
+    return pixels
+
+# uncompressed test image, None if internalformat cannot be produced
+def MakeTestImage(internalformat, width, height, content):
+    if OGLCommon.IsCompressionFormat(internalformat):
+        return None
+    if OGLCommon.GetElementCount(internalformat) == 4:
+        base_format = OGLEnum.GL_RGBA8
+    else:
+        base_format = OGLEnum.GL_RGB8
+    channels = OGLCommon.GetElementCount(base_format)
+    image = Image2D.FromArray(_MakePixels(width, height, channels, content), base_format)
+    if internalformat != base_format:
+        image = Convert(image, internalformat, cache=None)
+    return None if image.IsEmpty() else image
+
+# input of an edge, compressed sources are encoded from the decoded format,
+# random blocks stand for noise, None if the source cannot be produced
+def MakeSourceImage(src_format, dst_format, size, content):
+    if not OGLCommon.IsCompressionFormat(src_format):
+        return MakeTestImage(src_format, size, size, content)
+
+    (bwidth, bheight) = OGLCommon.GetBlockDimension(src_format)
+    if content == 'noise':
+        blocks = np.random.RandomState(0).randint(0, 256,
+            ((size + bheight - 1) // bheight, (size + bwidth - 1) // bwidth,
+            OGLCommon.GetBlockSize(src_format))).astype(np.uint8)
+        return Image2D.FromArray(blocks, src_format, size, size)
+
+    options = {'cache' : None}
+    if src_format in OGLETCCodec.ETC_ENCODE_FORMATS:
+        options['etc_effort'] = 'fast'
+    elif not _RouteAvailable(dst_format, src_format):
+        return None
+    image = MakeTestImage(dst_format, size, size, content)
+    if image is None:
+        return None
+    image = Convert(image, src_format, **options)
+    return None if image.IsEmpty() else image
+
+def _ChildSeconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+# runs in a fresh worker, the first (cold) conversion gives the peak memory,
+# the best of repeat warm conversions gives the throughput
+def _BenchmarkCase(args):
+    (src_format, dst_format, effort, size, content, repeat) = args
+    result = {'edge' : GetEdgeName(src_format, dst_format), 'effort' : effort or 'default',
+        'size' : size, 'content' : content}
+
+    options = _EffortOptions(src_format, dst_format, effort)
+    tool = GetEdgeTool(src_format, dst_format)
+    # an etc_effort level replaces etcpack with the in-process encoder
+    if 'etc_effort' in options:
+        tool = None
+    if tool and not FindTool(tool):
+        result['skipped'] = 'cannot find {0}'.format(tool)
+        return result
+    input_image = MakeSourceImage(src_format, dst_format, size, content)
+    if input_image is None:
+        result['skipped'] = 'cannot produce {0} input'.format(content)
+        return result
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    output_image = Convert(input_image, dst_format, cache=None, **options)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if output_image.IsEmpty():
+        result['skipped'] = 'conversion failed'
+        return result
+
+    seconds = []
+    child_seconds = _ChildSeconds()
+    for i in range(repeat):
+        start = time.time()
+        Convert(input_image, dst_format, cache=None, **options)
+        seconds.append(time.time() - start)
+    child_seconds = _ChildSeconds() - child_seconds
+
+    best = max(min(seconds), 1e-9)
+    result.update({
+        'seconds' : best,
+        'megapixels_per_second' : size * size / best / 1e6,
+        'peak_memory_mb' : (peak_rss - base_rss) / 1024.,
+        'subprocess_seconds' : child_seconds / repeat,
+    })
+    return result
+
+# edges filters edge names by substring, all edges by default
+def RunBenchmarks(sizes=SIZES, contents=CONTENTS, repeat=3, edges=None):
+    cases = [(src_format, dst_format, effort, size, content, repeat)
+        for src_format, dst_format in ListEdges()
+        if not edges or any(name in GetEdgeName(src_format, dst_format) for name in edges)
+        for effort in ListEfforts(src_format, dst_format)
+        for size in sizes
+        for content in contents]
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        return list(pool.imap(_BenchmarkCase, cases))
+    finally:
+        pool.terminate()
+
+# cases are compared per effort level, baselines written before effort
+# levels were measured only hold the default one
+def _CaseKey(case):
+    return (case['edge'], case.get('effort', 'default'), case['size'], case['content'])
+
+# Return the cases of results that are slower, or use more memory, than the
+# same case of baseline by more than threshold (a fraction)
+def CompareResults(results, baseline, threshold=0.1):
+    baseline_cases = dict((_CaseKey(case), case)
+        for case in baseline if 'skipped' not in case)
+    regressions = []
+    for case in results:
+        base_case = baseline_cases.get(_CaseKey(case))
+        if 'skipped' in case or base_case is None:
+            continue
+        reasons = []
+        if case['megapixels_per_second'] < base_case['megapixels_per_second'] * (1 - threshold):
+            reasons.append('throughput {0:.2f} < {1:.2f} MP/s'.format(
+                case['megapixels_per_second'], base_case['megapixels_per_second']))
+        if case['peak_memory_mb'] > max(base_case['peak_memory_mb'] * (1 + threshold),
+            base_case['peak_memory_mb'] + MEMORY_NOISE_MB):
+            reasons.append('peak memory {0:.1f} > {1:.1f} MB'.format(
+                case['peak_memory_mb'], base_case['peak_memory_mb']))
+        if reasons:
+            regressions.append((case, reasons))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the throughput of every converter edge')
+    parser.add_argument('edges', nargs='*', help='only run edges whose name contains one of these')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--contents', nargs='+', choices=CONTENTS, default=list(CONTENTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with the results stored in this file')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = RunBenchmarks(args.sizes, args.contents, args.repeat, args.edges)
+    for result in results:
+        if 'skipped' in result:
+            print('{edge:<56} {effort:<10} {size:>5} {content:<8}  skipped, {skipped}'.format(**result))
+        else:
+            print('{edge:<56} {effort:<10} {size:>5} {content:<8} {megapixels_per_second:9.2f} MP/s  '
+                'peak {peak_memory_mb:7.1f} MB  subprocess {subprocess_seconds:7.3f} s'.format(**result))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = CompareResults(results, json.load(f), args.threshold)
+        for case, reasons in regressions:
+            print('REGRESSION {edge} {effort} {size} {content} : {0}'.format('; '.join(reasons), **case))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import argparse, json, subprocess, sys
+
+# Measure the import time of library modules, every sample runs in a fresh
+# interpreter so that nothing is cached in sys.modules
+
+HEAVY_MODULES = ('numpy', 'PIL', 'networkx', 'OGLETCCodec', 'OGLASTCCodec')
+
+SAMPLE_SCRIPT = '''
+import json, sys, time
+start = time.time()
+import {0}
+elapsed = time.time() - start
+print(json.dumps({{'seconds' : elapsed,
+    'loaded' : [m for m in {1!r} if m in sys.modules]}}))
+'''
+
+def MeasureImportTime(module_name, repeat=10):
+    script = SAMPLE_SCRIPT.format(module_name, HEAVY_MODULES)
+    samples = []
+    loaded = []
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', script])
+        sample = json.loads(output.splitlines()[-1])
+        samples.append(sample['seconds'])
+        loaded = sample['loaded']
+    samples.sort()
+    return {
+        'module' : module_name,
+        'repeat' : repeat,
+        'min_ms' : samples[0] * 1000,
+        'median_ms' : samples[len(samples) // 2] * 1000,
+        'heavy_modules_loaded' : loaded,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time of OGLImage modules')
+    parser.add_argument('modules', nargs='*',
+        default=['OGLCommon', 'OGLImageIO', 'OGLImageConverter'])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = [MeasureImportTime(name, args.repeat) for name in args.modules]
+    for result in results:
+        print('{module:<20} min {min_ms:7.2f} ms  median {median_ms:7.2f} ms  heavy {heavy_modules_loaded}'.format(**result))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,628 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+import OGLCommon
+from OGLCommon import IsASTCSRGBFormat
+
+# ASTC LDR block decoder working on whole images at once. Block layouts vary
+# from block to block, so fields living at fixed positions are read for every
+# block in one pass and variable layouts (integer sequences, weight grids) are
+# decoded for all blocks sharing the same layout together
+
+ASTC_BLOCK_SIZE = 16
+ASTC_BLOCK_BITS = 128
+
+# color returned for illegal encodings
+ASTC_ERROR_COLOR = (0xFF, 0x00, 0xFF, 0xFF)
+
+# (levels, trits, quints, bits) of every quantization level,
+# weights use the first 12 levels, color endpoints use them all
+ASTC_QUANT_LEVELS = (
+    (2,   0, 0, 1),
+    (3,   1, 0, 0),
+    (4,   0, 0, 2),
+    (5,   0, 1, 0),
+    (6,   1, 0, 1),
+    (8,   0, 0, 3),
+    (10,  0, 1, 1),
+    (12,  1, 0, 2),
+    (16,  0, 0, 4),
+    (20,  0, 1, 2),
+    (24,  1, 0, 3),
+    (32,  0, 0, 5),
+    (40,  0, 1, 3),
+    (48,  1, 0, 4),
+    (64,  0, 0, 6),
+    (80,  0, 1, 4),
+    (96,  1, 0, 5),
+    (128, 0, 0, 7),
+    (160, 0, 1, 5),
+    (192, 1, 0, 6),
+    (256, 0, 0, 8),
+)
+
+QUANT_6 = 4
+
+# LDR color endpoint modes, the others are HDR ones and illegal in LDR
+ASTC_LDR_ENDPOINT_MODES = (0, 1, 4, 5, 6, 8, 9, 10, 12, 13)
+
+def GetISEBitCount(count, quant):
+    _, trits, quints, bits = ASTC_QUANT_LEVELS[quant]
+    if trits:
+        return (8 * count + 4) // 5 + count * bits
+    if quints:
+        return (7 * count + 2) // 3 + count * bits
+    return count * bits
+
+def _BuildTritTable():
+    table = np.zeros((256, 5), dtype=np.int64)
+    for t in range(256):
+        bit = lambda i: (t >> i) & 1
+        if (t >> 2) & 7 == 7:
+            c = (((t >> 5) & 7) << 2) | (t & 3)
+            t4 = t3 = 2
+        else:
+            c = t & 0x1F
+            if (t >> 5) & 3 == 3:
+                t4 = 2
+                t3 = bit(7)
+            else:
+                t4 = bit(7)
+                t3 = (t >> 5) & 3
+        cbit = lambda i: (c >> i) & 1
+        if c & 3 == 3:
+            t2 = 2
+            t1 = cbit(4)
+            t0 = (cbit(3) << 1) | (cbit(2) & ~cbit(3) & 1)
+        elif (c >> 2) & 3 == 3:
+            t2 = t1 = 2
+            t0 = c & 3
+        else:
+            t2 = cbit(4)
+            t1 = (c >> 2) & 3
+            t0 = (cbit(1) << 1) | (cbit(0) & ~cbit(1) & 1)
+        table[t] = (t0, t1, t2, t3, t4)
+    return table
+
+def _BuildQuintTable():
+    table = np.zeros((128, 3), dtype=np.int64)
+    for q in range(128):
+        bit = lambda i: (q >> i) & 1
+        if (q >> 1) & 3 == 3 and (q >> 5) & 3 == 0:
+            q2 = (bit(0) << 2) | ((bit(4) & ~bit(0) & 1) << 1) | (bit(3) & ~bit(0) & 1)
+            q1 = q0 = 4
+        else:
+            if (q >> 1) & 3 == 3:
+                q2 = 4
+                c = (((q >> 3) & 3) << 3) | ((~(q >> 5) & 3) << 1) | bit(0)
+            else:
+                q2 = (q >> 5) & 3
+                c = q & 0x1F
+            if c & 7 == 5:
+                q1 = 4
+                q0 = (c >> 3) & 3
+            else:
+                q1 = (c >> 3) & 3
+                q0 = c & 7
+        table[q] = (q0, q1, q2)
+    return table
+
+TRIT_TABLE = _BuildTritTable()
+QUINT_TABLE = _BuildQuintTable()
+
+def _BitPattern(pattern, value):
+    # pattern is written from the most significant bit, letter 'a' is bit 0 of value
+    result = 0
+    for char in pattern:
+        result <<= 1
+        if char != '0':
+            result |= (value >> (ord(char) - ord('a'))) & 1
+    return result
+
+def _ReplicateBits(value, bits, target_bits):
+    result = 0
+    shift = target_bits
+    while shift > 0:
+        shift -= bits
+        result |= (value << shift) if shift >= 0 else (value >> -shift)
+    return result
+
+# (trits or quints, bits) -> (B bit pattern, C) used to unquantize color endpoints
+COLOR_UNQUANT_PARAMS = {
+    (3, 1) : ('000000000', 204),
+    (3, 2) : ('b000b0bb0', 93),
+    (3, 3) : ('cb000cbcb', 44),
+    (3, 4) : ('dcb000dcb', 22),
+    (3, 5) : ('edcb000ed', 11),
+    (3, 6) : ('fedcb000f', 5),
+    (5, 1) : ('000000000', 113),
+    (5, 2) : ('b0000bb00', 54),
+    (5, 3) : ('cb0000cbc', 26),
+    (5, 4) : ('dcb0000dc', 13),
+    (5, 5) : ('edcb0000e', 6),
+}
+
+WEIGHT_UNQUANT_PARAMS = {
+    (3, 1) : ('0000000', 50),
+    (3, 2) : ('b000b0b', 23),
+    (3, 3) : ('cb000cb', 11),
+    (5, 1) : ('0000000', 28),
+    (5, 2) : ('b0000b0', 13),
+}
+
+def _BuildColorUnquantTable():
+    table = np.zeros((len(ASTC_QUANT_LEVELS), 256), dtype=np.int64)
+    for quant, (levels, trits, quints, bits) in enumerate(ASTC_QUANT_LEVELS):
+        for value in range(levels):
+            if trits or quints:
+                if quant < QUANT_6:
+                    continue
+                pattern, c = COLOR_UNQUANT_PARAMS[(3 if trits else 5, bits)]
+                low = value & ((1 << bits) - 1)
+                a = 0x1FF if low & 1 else 0
+                t = (value >> bits) * c + _BitPattern(pattern, low)
+                t ^= a
+                table[quant, value] = (a & 0x80) | (t >> 2)
+            else:
+                table[quant, value] = _ReplicateBits(value, bits, 8)
+    return table
+
+def _BuildWeightUnquantTable():
+    table = np.zeros((12, 32), dtype=np.int64)
+    for quant, (levels, trits, quints, bits) in enumerate(ASTC_QUANT_LEVELS[:12]):
+        for value in range(levels):
+            if (trits or quints) and bits == 0:
+                result = value * 64 // (levels - 1)
+            elif trits or quints:
+                pattern, c = WEIGHT_UNQUANT_PARAMS[(3 if trits else 5, bits)]
+                a = 0x7F if value & 1 else 0
+                t = (value >> bits) * c + _BitPattern(pattern, value & ((1 << bits) - 1))
+                t ^= a
+                result = (a & 0x20) | (t >> 2)
+                if result > 32:
+                    result += 1
+            else:
+                result = _ReplicateBits(value, bits, 6)
+                if result > 32:
+                    result += 1
+            table[quant, value] = result
+    return table
+
+COLOR_UNQUANT_TABLE = _BuildColorUnquantTable()
+WEIGHT_UNQUANT_TABLE = _BuildWeightUnquantTable()
+
+def _BuildColorQuantTable():
+    # highest quantization level fitting `count` integers into `bits` bits,
+    # indexed by [count // 2][bits], -1 when even the lowest level does not fit
+    table = np.zeros((10, ASTC_BLOCK_BITS), dtype=np.int64)
+    table.fill(-1)
+    for pairs in range(1, 10):
+        for bits in range(ASTC_BLOCK_BITS):
+            for quant in range(len(ASTC_QUANT_LEVELS) - 1, -1, -1):
+                if GetISEBitCount(pairs * 2, quant) <= bits:
+                    table[pairs, bits] = quant
+                    break
+    return table
+
+COLOR_QUANT_TABLE = _BuildColorQuantTable()
+
+def _DecodeBlockMode(mode, bwidth, bheight):
+    # returns (x weights, y weights, dual plane, weight quant, weight bits) or None
+    high_precision = (mode >> 9) & 1
+    dual_plane = (mode >> 10) & 1
+    a = (mode >> 5) & 3
+    base_quant = (mode >> 4) & 1
+
+    if mode & 3:
+        base_quant |= (mode & 3) << 1
+        b = (mode >> 7) & 3
+        layout = (mode >> 2) & 3
+        if layout == 0:
+            xweights, yweights = b + 4, a + 2
+        elif layout == 1:
+            xweights, yweights = b + 8, a + 2
+        elif layout == 2:
+            xweights, yweights = a + 2, b + 8
+        elif mode & 0x100:
+            xweights, yweights = (b & 1) + 2, a + 2
+        else:
+            xweights, yweights = a + 2, (b & 1) + 6
+    else:
+        base_quant |= ((mode >> 2) & 3) << 1
+        if (mode >> 2) & 3 == 0:
+            return None
+        b = (mode >> 9) & 3
+        layout = (mode >> 7) & 3
+        if layout == 0:
+            xweights, yweights = 12, a + 2
+        elif layout == 1:
+            xweights, yweights = a + 2, 12
+        elif layout == 2:
+            xweights, yweights = a + 6, b + 6
+            dual_plane = high_precision = 0
+        elif a == 0:
+            xweights, yweights = 6, 10
+        elif a == 1:
+            xweights, yweights = 10, 6
+        else:
+            return None
+
+    quant = base_quant - 2 + 6 * high_precision
+    count = xweights * yweights * (dual_plane + 1)
+    if xweights > bwidth or yweights > bheight or count > 64:
+        return None
+    bits = GetISEBitCount(count, quant)
+    if not 24 <= bits <= 96:
+        return None
+    return xweights, yweights, dual_plane, quant, bits
+
+_block_mode_tables = {}
+
+def _BlockModeTable(bwidth, bheight):
+    # every 11-bit block mode decoded once per footprint, as a (2048, 6) array of
+    # (valid, x weights, y weights, dual plane, weight quant, weight bits)
+    key = (bwidth, bheight)
+    if key not in _block_mode_tables:
+        table = np.zeros((2048, 6), dtype=np.int64)
+        for mode in range(2048):
+            decoded = _DecodeBlockMode(mode, bwidth, bheight)
+            if decoded:
+                table[mode] = (1, ) + decoded
+            else:
+                # harmless layout for illegal modes, those blocks end up with the error color
+                table[mode] = (0, 2, 2, 0, 0, 24)
+        _block_mode_tables[key] = table
+    return _block_mode_tables[key]
+
+def _ReadBits(bits, start, count):
+    # field at a fixed position of every block
+    weights = 1 << np.arange(count, dtype=np.int64)
+    return bits[:, start:start + count].dot(weights)
+
+def _ReadBitsAt(bits, start, count, max_count):
+    # field at per-block position `start` with per-block width `count`
+    offsets = np.arange(max_count)
+    positions = np.clip(start[:, None] + offsets, 0, ASTC_BLOCK_BITS - 1)
+    values = bits[np.arange(len(bits))[:, None], positions]
+    values = values * (offsets < count[:, None])
+    return values.dot(1 << np.arange(max_count, dtype=np.int64))
+
+_ise_layouts = {}
+
+def _ISELayout(quant, count):
+    # bit positions of an integer sequence relative to its start:
+    # (value bit positions (count, bits), trit/quint bit positions (groups, 8 or 7),
+    #  mask of trit/quint bits inside the sequence)
+    key = (quant, count)
+    if key not in _ise_layouts:
+        _, trits, quints, bits = ASTC_QUANT_LEVELS[quant]
+        if trits:
+            group_size, extra_bits = 5, (2, 2, 1, 2, 1)
+        elif quints:
+            group_size, extra_bits = 3, (3, 2, 2)
+        else:
+            group_size, extra_bits = 1, (0, )
+        length = GetISEBitCount(count, quant)
+
+        groups = (count + group_size - 1) // group_size
+        value_positions = np.zeros((groups * group_size, bits), dtype=np.int64)
+        extra_positions = np.zeros((groups, sum(extra_bits)), dtype=np.int64)
+        position = 0
+        for group in range(groups):
+            extra = 0
+            for index in range(group_size):
+                value_positions[group * group_size + index] = position + np.arange(bits)
+                position += bits
+                for _ in range(extra_bits[index]):
+                    extra_positions[group, extra] = position
+                    extra += 1
+                    position += 1
+        extra_mask = extra_positions < length
+        _ise_layouts[key] = (value_positions[:count], np.where(extra_mask, extra_positions, 0), extra_mask)
+    return _ise_layouts[key]
+
+def _DecodeISE(bits, quant, count, start, max_count):
+    # integer sequences of every block, blocks are grouped by layout and each
+    # group decoded at once, returns a (block count, max_count) array
+    values = np.zeros((len(bits), max_count), dtype=np.int64)
+    keys = (quant * 256 + count) * 256 + start
+    for key in np.unique(keys):
+        rows = np.nonzero(keys == key)[0]
+        group_quant, group_count, group_start = key // 65536, (key // 256) % 256, key % 256
+        if group_count == 0:
+            continue
+        _, trits, quints, nbits = ASTC_QUANT_LEVELS[group_quant]
+        value_positions, extra_positions, extra_mask = _ISELayout(group_quant, group_count)
+        group_bits = bits[rows]
+
+        result = np.zeros((len(rows), group_count), dtype=np.int64)
+        if nbits:
+            low = group_bits[:, value_positions + group_start]
+            result += low.dot(1 << np.arange(nbits, dtype=np.int64))
+        if trits or quints:
+            extra = group_bits[:, extra_positions + group_start] * extra_mask
+            packed = extra.dot(1 << np.arange(extra.shape[-1], dtype=np.int64))
+            table = TRIT_TABLE if trits else QUINT_TABLE
+            digits = table[packed].reshape((len(rows), -1))[:, :group_count]
+            result += digits << nbits
+        values[rows, :group_count] = result
+    return values
+
+def _Hash52(value):
+    value = value.astype(np.uint32)
+    value ^= value >> np.uint32(15)
+    value *= np.uint32(0xEEDE0891)
+    value ^= value >> np.uint32(5)
+    value += value << np.uint32(16)
+    value ^= value >> np.uint32(7)
+    value ^= value >> np.uint32(3)
+    value ^= value << np.uint32(6)
+    value ^= value >> np.uint32(17)
+    return value.astype(np.int64)
+
+def _SelectPartitions(seed, partition_count, bwidth, bheight):
+    # partition of every texel, (block count, texel count)
+    x = np.tile(np.arange(bwidth), bheight)
+    y = np.repeat(np.arange(bheight), bwidth)
+    if bwidth * bheight < 31:
+        x, y = x << 1, y << 1
+
+    seed = seed + (partition_count - 1) * 1024
+    rnum = _Hash52(seed)
+    seeds = [(rnum >> shift) & 0xF for shift in (0, 4, 8, 12, 16, 20, 24, 28, 18, 22, 26)]
+    seeds.append(((rnum >> 30) | (rnum << 2)) & 0xF)
+    seeds = [s * s for s in seeds]
+
+    three = partition_count == 3
+    sh1 = np.where(seed & 1, np.where(seed & 2, 4, 5), np.where(three, 6, 5))
+    sh2 = np.where(seed & 1, np.where(three, 6, 5), np.where(seed & 2, 4, 5))
+    sh3 = np.where(seed & 0x10, sh1, sh2)
+    shifts = (sh1, sh2, sh1, sh2, sh1, sh2, sh1, sh2, sh3, sh3, sh3, sh3)
+    seeds = [(s >> sh)[:, None] for s, sh in zip(seeds, shifts)]
+
+    # texels are 2D, the z terms vanish
+    a = (seeds[0] * x + seeds[1] * y + (rnum >> 14)[:, None]) & 0x3F
+    b = (seeds[2] * x + seeds[3] * y + (rnum >> 10)[:, None]) & 0x3F
+    c = (seeds[4] * x + seeds[5] * y + (rnum >> 6)[:, None]) & 0x3F
+    d = (seeds[6] * x + seeds[7] * y + (rnum >> 2)[:, None]) & 0x3F
+    c = c * (partition_count >= 3)[:, None]
+    d = d * (partition_count >= 4)[:, None]
+
+    return np.where((a >= b) & (a >= c) & (a >= d), 0,
+        np.where((b >= c) & (b >= d), 1,
+        np.where(c >= d, 2, 3)))
+
+_infill_tables = {}
+
+def _InfillTable(bwidth, bheight, xweights, yweights):
+    # grid indices (texels, 4) and bilinear factors (texels, 4) of the weight infill
+    key = (bwidth, bheight, xweights, yweights)
+    if key not in _infill_tables:
+        ds = (1024 + bwidth // 2) // (bwidth - 1)
+        dt = (1024 + bheight // 2) // (bheight - 1)
+        s = np.tile(np.arange(bwidth), bheight)
+        t = np.repeat(np.arange(bheight), bwidth)
+        gs = (ds * s * (xweights - 1) + 32) >> 6
+        gt = (dt * t * (yweights - 1) + 32) >> 6
+        js, fs = gs >> 4, gs & 0xF
+        jt, ft = gt >> 4, gt & 0xF
+
+        v0 = js + jt * xweights
+        last = xweights * yweights - 1
+        indices = np.column_stack((v0, v0 + 1, v0 + xweights, v0 + xweights + 1))
+        w11 = (fs * ft + 8) >> 4
+        factors = np.column_stack((16 - fs - ft + w11, fs - w11, ft - w11, w11))
+        # samples outside of the grid always come with a zero factor
+        _infill_tables[key] = (np.minimum(indices, last), factors)
+    return _infill_tables[key]
+
+def _BitTransferSigned(a, b):
+    b = (b >> 1) | (a & 0x80)
+    a = (a >> 1) & 0x3F
+    a = np.where(a & 0x20, a - 0x40, a)
+    return a, b
+
+def _BlueContract(r, g, b, a):
+    return (r + b) >> 1, (g + b) >> 1, b, a
+
+def _DecodeEndpoints(mode, v):
+    # v is (count, 8) unquantized integers, returns two (count, 4) endpoints
+    ones = np.ones(len(v), dtype=np.int64) * 0xFF
+    if mode == 0:
+        e0 = (v[:, 0], v[:, 0], v[:, 0], ones)
+        e1 = (v[:, 1], v[:, 1], v[:, 1], ones)
+    elif mode == 1:
+        l0 = (v[:, 0] >> 2) | (v[:, 1] & 0xC0)
+        l1 = np.minimum(l0 + (v[:, 1] & 0x3F), 0xFF)
+        e0 = (l0, l0, l0, ones)
+        e1 = (l1, l1, l1, ones)
+    elif mode == 4:
+        e0 = (v[:, 0], v[:, 0], v[:, 0], v[:, 2])
+        e1 = (v[:, 1], v[:, 1], v[:, 1], v[:, 3])
+    elif mode == 5:
+        o1, b0 = _BitTransferSigned(v[:, 1], v[:, 0])
+        o3, b2 = _BitTransferSigned(v[:, 3], v[:, 2])
+        e0 = (b0, b0, b0, b2)
+        e1 = (b0 + o1, b0 + o1, b0 + o1, b2 + o3)
+    elif mode in (6, 10):
+        alpha0 = v[:, 4] if mode == 10 else ones
+        alpha1 = v[:, 5] if mode == 10 else ones
+        e0 = ((v[:, 0] * v[:, 3]) >> 8, (v[:, 1] * v[:, 3]) >> 8, (v[:, 2] * v[:, 3]) >> 8, alpha0)
+        e1 = (v[:, 0], v[:, 1], v[:, 2], alpha1)
+    elif mode in (8, 12):
+        alpha0 = v[:, 6] if mode == 12 else ones
+        alpha1 = v[:, 7] if mode == 12 else ones
+        first = (v[:, 0], v[:, 2], v[:, 4], alpha0)
+        second = (v[:, 1], v[:, 3], v[:, 5], alpha1)
+        ordered = (v[:, 1] + v[:, 3] + v[:, 5]) >= (v[:, 0] + v[:, 2] + v[:, 4])
+        e0 = [np.where(ordered, f, c) for f, c in zip(first, _BlueContract(*second))]
+        e1 = [np.where(ordered, s, c) for s, c in zip(second, _BlueContract(*first))]
+    elif mode in (9, 13):
+        o1, b0 = _BitTransferSigned(v[:, 1], v[:, 0])
+        o3, b2 = _BitTransferSigned(v[:, 3], v[:, 2])
+        o5, b4 = _BitTransferSigned(v[:, 5], v[:, 4])
+        if mode == 13:
+            o7, b6 = _BitTransferSigned(v[:, 7], v[:, 6])
+        else:
+            o7, b6 = 0, ones
+        base = (b0, b2, b4, b6)
+        offset = (b0 + o1, b2 + o3, b4 + o5, b6 + o7)
+        ordered = (o1 + o3 + o5) >= 0
+        e0 = [np.where(ordered, b, c) for b, c in zip(base, _BlueContract(*offset))]
+        e1 = [np.where(ordered, o, c) for o, c in zip(offset, _BlueContract(*base))]
+    return np.clip(np.column_stack(e0), 0, 0xFF), np.clip(np.column_stack(e1), 0, 0xFF)
+
+def _DecodeNormalBlocks(bits, bwidth, bheight, srgb):
+    # (colors (block count, texel count, 4) as 16-bit values, error mask)
+    count = len(bits)
+    rows = np.arange(count)
+    texel_count = bwidth * bheight
+
+    mode = _ReadBits(bits, 0, 11)
+    valid, xweights, yweights, dual_plane, weight_quant, weight_bits = \
+        _BlockModeTable(bwidth, bheight)[mode].T
+    partition_count = _ReadBits(bits, 11, 2) + 1
+    error = (valid == 0) | ((dual_plane == 1) & (partition_count == 4))
+    below_weights = ASTC_BLOCK_BITS - weight_bits
+
+    # color endpoint modes of every partition
+    single_mode = _ReadBits(bits, 13, 4)
+    encoded_mode = _ReadBits(bits, 23, 6)
+    base_class = encoded_mode & 3
+    extra_size = np.where((partition_count > 1) & (base_class != 0), 3 * partition_count - 4, 0)
+    encoded_mode |= _ReadBitsAt(bits, below_weights - extra_size, extra_size, 8) << 6
+    endpoint_modes = np.zeros((count, 4), dtype=np.int64)
+    partitions = np.arange(4)
+    for index in partitions:
+        shared = (encoded_mode >> 2) & 0xF
+        high = (((encoded_mode >> (2 + index)) & 1) + base_class - 1) << 2
+        low = (encoded_mode >> (2 + partition_count + 2 * index)) & 3
+        endpoint_modes[:, index] = np.where(partition_count == 1, single_mode,
+            np.where(base_class == 0, shared, high + low))
+    used = partitions < partition_count[:, None]
+    endpoint_modes *= used
+    value_counts = ((endpoint_modes >> 2) + 1) * 2 * used
+    integer_count = value_counts.sum(axis=1)
+    error |= integer_count > 18
+
+    color_bits = np.where(partition_count == 1, 111, 99 - extra_size) - weight_bits - 2 * dual_plane
+    color_quant = COLOR_QUANT_TABLE[np.minimum(integer_count, 18) // 2, np.clip(color_bits, 0, ASTC_BLOCK_BITS - 1)]
+    error |= color_quant < QUANT_6
+    color_quant = np.maximum(color_quant, QUANT_6)
+    integer_count = np.where(error, 0, integer_count)
+    value_counts *= ~error[:, None]
+
+    color_start = np.where(partition_count == 1, 17, 29)
+    values = _DecodeISE(bits, color_quant, integer_count, color_start, 18)
+    values = COLOR_UNQUANT_TABLE[color_quant[:, None], values]
+    component = _ReadBitsAt(bits, below_weights - extra_size - 2, dual_plane * 2, 2)
+
+    # endpoints of every partition
+    endpoints = np.zeros((count, 4, 2, 4), dtype=np.int64)
+    offsets = np.cumsum(value_counts, axis=1) - value_counts
+    padded = np.concatenate((values, np.zeros((count, 8), dtype=np.int64)), axis=1)
+    for index in partitions:
+        gathered = padded[rows[:, None], offsets[:, index, None] + np.arange(8)]
+        for endpoint_mode in ASTC_LDR_ENDPOINT_MODES:
+            selected = np.nonzero(used[:, index] & (endpoint_modes[:, index] == endpoint_mode))[0]
+            if len(selected):
+                e0, e1 = _DecodeEndpoints(endpoint_mode, gathered[selected])
+                endpoints[selected, index, 0] = e0
+                endpoints[selected, index, 1] = e1
+        # HDR endpoints are illegal in LDR, only their partition shows the error color
+        hdr = used[:, index] & ~np.in1d(endpoint_modes[:, index], ASTC_LDR_ENDPOINT_MODES)
+        endpoints[hdr, index] = ASTC_ERROR_COLOR
+
+    # weights are stored from the top of the block downwards
+    reversed_bits = bits[:, ::-1]
+    weight_count = np.where(error, 0, xweights * yweights * (dual_plane + 1))
+    weights = _DecodeISE(reversed_bits, weight_quant, weight_count, np.zeros(count, dtype=np.int64), 64)
+    weights = WEIGHT_UNQUANT_TABLE[weight_quant[:, None], np.minimum(weights, 31)]
+
+    plane_weights = np.zeros((count, 2, texel_count), dtype=np.int64)
+    grids = (xweights * 16 + yweights) * 2 + dual_plane
+    for grid in np.unique(grids):
+        selected = np.nonzero(grids == grid)[0]
+        grid_x, grid_y, grid_dual = grid // 32, (grid // 2) % 16, grid % 2
+        indices, factors = _InfillTable(bwidth, bheight, grid_x, grid_y)
+        for plane in range(grid_dual + 1):
+            samples = weights[selected[:, None, None], indices * (grid_dual + 1) + plane]
+            plane_weights[selected, plane] = ((samples * factors).sum(axis=-1) + 8) >> 4
+    channel_weights = np.repeat(plane_weights[:, 0, :, None], 4, axis=-1)
+    second_plane = (dual_plane[:, None] == 1) & (np.arange(4) == component[:, None])
+    channel_weights = np.where(second_plane[:, None, :], plane_weights[:, 1, :, None], channel_weights)
+
+    # partition of every texel
+    texel_partitions = np.zeros((count, texel_count), dtype=np.int64)
+    multiple = np.nonzero(partition_count > 1)[0]
+    if len(multiple):
+        seed = _ReadBits(bits[multiple], 13, 10)
+        texel_partitions[multiple] = _SelectPartitions(seed, partition_count[multiple], bwidth, bheight)
+
+    # endpoints to 16 bits, sRGB color channels are centered, alpha stays linear
+    texel_endpoints = endpoints[rows[:, None], texel_partitions]
+    c0 = texel_endpoints[:, :, 0] * 257
+    c1 = texel_endpoints[:, :, 1] * 257
+    if srgb:
+        c0[..., :3] = (texel_endpoints[:, :, 0, :3] << 8) | 0x80
+        c1[..., :3] = (texel_endpoints[:, :, 1, :3] << 8) | 0x80
+    colors = (c0 * (64 - channel_weights) + c1 * channel_weights + 32) >> 6
+    return colors, error
+
+def _DecodeVoidExtentBlocks(bits, bwidth, bheight):
+    # constant color blocks, (colors (block count, texel count, 4) as 16-bit values, error mask)
+    hdr = bits[:, 9] == 1
+    reserved = _ReadBits(bits, 10, 2) != 3
+    min_s, max_s = _ReadBits(bits, 12, 13), _ReadBits(bits, 25, 13)
+    min_t, max_t = _ReadBits(bits, 38, 13), _ReadBits(bits, 51, 13)
+    all_ones = (min_s == 0x1FFF) & (max_s == 0x1FFF) & (min_t == 0x1FFF) & (max_t == 0x1FFF)
+    bad_extent = ~all_ones & ((min_s >= max_s) | (min_t >= max_t))
+    color = np.column_stack([_ReadBits(bits, 64 + 16 * channel, 16) for channel in range(4)])
+    colors = np.repeat(color[:, None, :], bwidth * bheight, axis=1)
+    return colors, hdr | reserved | bad_extent
+
+# Decode ASTC LDR compressed data into a (height, width, 4) uint8 array,
+# the uncompressed format is given by GetASTCDecodeFormat
+def DecodeASTC(data, width, height, internalformat):
+    bwidth, bheight = OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION[internalformat]
+    srgb = IsASTCSRGBFormat(internalformat)
+    xblocks = (width + bwidth - 1) // bwidth
+    yblocks = (height + bheight - 1) // bheight
+    count = xblocks * yblocks
+
+    blocks = np.frombuffer(data, dtype=np.uint8, count=count * ASTC_BLOCK_SIZE).reshape((count, ASTC_BLOCK_SIZE))
+    bits = ((blocks[:, :, None] >> np.arange(8, dtype=np.uint8)) & 1).reshape((count, ASTC_BLOCK_BITS)).astype(np.int64)
+
+    colors = np.zeros((count, bwidth * bheight, 4), dtype=np.int64)
+    error = np.zeros(count, dtype=bool)
+    void_extent = _ReadBits(bits, 0, 9) == 0x1FC
+    for selected, decode in ((void_extent, _DecodeVoidExtentBlocks), (~void_extent, _DecodeNormalBlocks)):
+        if selected.any():
+            if decode is _DecodeNormalBlocks:
+                colors[selected], error[selected] = decode(bits[selected], bwidth, bheight, srgb)
+            else:
+                colors[selected], error[selected] = decode(bits[selected], bwidth, bheight)
+
+    # 16-bit results to 8-bit by keeping the top bits
+    pixels = colors >> 8
+    pixels[error] = ASTC_ERROR_COLOR
+
+    image = pixels.astype(np.uint8).reshape((yblocks, xblocks, bheight, bwidth, 4)) \
+        .transpose((0, 2, 1, 3, 4)) \
+        .reshape((yblocks * bheight, xblocks * bwidth, 4))
+    return image[:height, :width]
+
+# LDR void-extent header without extent (all coordinates set), followed by
+# the four UNORM16 channels
+ASTC_VOID_EXTENT_HEADER = 'FCFDFFFFFFFFFFFF'.decode('hex')
+
+# Encode solid color blocks, colors is a (block count, 4) uint8 array, as
+# void-extent blocks, returns the (block count, 16) uint8 blocks and which of
+# them are exact encodings (all of them, 8-bit values expand to UNORM16)
+def EncodeASTCSolidBlocks(colors, internalformat):
+    blocks = np.empty((len(colors), ASTC_BLOCK_SIZE), dtype=np.uint8)
+    blocks[:, :8] = np.frombuffer(ASTC_VOID_EXTENT_HEADER, dtype=np.uint8)
+    blocks[:, 8:] = (colors.astype(np.uint16) * 257).astype('<u2').view(np.uint8).reshape((-1, 8))
+    return blocks, np.ones(len(colors), dtype=bool)
@@ -0,0 +1,160 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import OGLCommon
+from OGLCommon import GetImageSize
+from OGLImage import Image2D
+from UtilCommon import LazyModule
+
+np = LazyModule('numpy')
+OGLETCCodec = LazyModule('OGLETCCodec')
+OGLASTCCodec = LazyModule('OGLASTCCodec')
+
+# Block passes in front of block encoders. The source image is cut into pixel
+# blocks of the destination footprint, partial blocks repeat the edge pixels
+# like the encoders do. Blocks a pass can encode itself are written directly
+# and only the remaining blocks, each distinct block once, are packed into a
+# smaller image handed to the encoder. Blocks are encoded independently of each other, so every packed
+# block comes back as the encoder would have written it in place.
+
+# blocks per row of packed images
+PACK_COLUMNS = 64
+
+# (block count, block height, block width, channels) pixel blocks in block order
+def GetPixelBlocks(image, dest_format):
+    (bwidth, bheight) = OGLCommon.GetBlockDimension(dest_format)
+    pixels = image.AsArray()
+    (height, width, channels) = pixels.shape
+    xblocks = (width + bwidth - 1) // bwidth
+    yblocks = (height + bheight - 1) // bheight
+    if (xblocks * bwidth, yblocks * bheight) != (width, height):
+        pixels = np.pad(pixels, ((0, yblocks * bheight - height), (0, xblocks * bwidth - width), (0, 0)), mode='edge')
+    return pixels.reshape((yblocks, bheight, xblocks, bwidth, channels)) \
+        .transpose((0, 2, 1, 3, 4)) \
+        .reshape((yblocks * xblocks, bheight, bwidth, channels))
+
+# image of internalformat holding the blocks in rows of PACK_COLUMNS,
+# the last row is completed with copies of the last block
+def PackBlocks(blocks, internalformat):
+    (count, bheight, bwidth, channels) = blocks.shape
+    columns = min(count, PACK_COLUMNS)
+    rows = (count + columns - 1) // columns
+    if rows * columns > count:
+        blocks = np.concatenate((blocks, np.repeat(blocks[-1:], rows * columns - count, axis=0)))
+    pixels = blocks.reshape((rows, columns, bheight, bwidth, channels)) \
+        .transpose((0, 2, 1, 3, 4)) \
+        .reshape((rows * bheight, columns * bwidth, channels))
+    return Image2D.FromArray(pixels, internalformat)
+
+# (count, block size) encoded blocks of a packed image in packing order
+def UnpackBlocks(image, count):
+    return image.AsArray().reshape((-1, OGLCommon.GetBlockSize(image.internalformat)))[:count]
+
+# which blocks hold one color, and the first color of every block
+def FindSolidBlocks(blocks):
+    pixels = blocks.reshape((len(blocks), -1, blocks.shape[-1]))
+    solid = (pixels.min(axis=1) == pixels.max(axis=1)).all(axis=1)
+    return solid, pixels[:, 0]
+
+# distinct blocks in first occurrence order, and the index into them of every block
+def FindUniqueBlocks(blocks):
+    rows = np.ascontiguousarray(blocks).reshape((len(blocks), -1))
+    keys = rows.view(np.dtype((np.void, rows.shape[1]))).ravel()
+    (_, first, inverse) = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return blocks[first[order]], rank[inverse]
+
+# which blocks differ between two block arrays of the same shape
+def FindChangedBlocks(blocks, previous_blocks):
+    return (blocks != previous_blocks).reshape((len(blocks), -1)).any(axis=1)
+
+# encoded solid color blocks and which of them are exact, see the codecs
+def EncodeSolidBlocks(colors, dest_format):
+    if OGLCommon.IsASTCCompressionFormat(dest_format):
+        return OGLASTCCodec.EncodeASTCSolidBlocks(colors, dest_format)
+    return OGLETCCodec.EncodeETCSolidBlocks(colors, dest_format)
+
+# Encode an uncompressed image into dest_format, encode(image) is the block
+# encoder used for the blocks the passes leave, with solid_blocks the solid
+# color blocks are written directly (ASTC void-extent, ETC single color),
+# with dedup_blocks repeated blocks are encoded once and copied
+def EncodeBlocks(input_image, dest_format, encode, solid_blocks=True, dedup_blocks=True):
+    width = input_image.width
+    height = input_image.height
+    blocks = GetPixelBlocks(input_image, dest_format)
+    encoded = np.zeros((len(blocks), OGLCommon.GetBlockSize(dest_format)), dtype=np.uint8)
+    pending = np.ones(len(blocks), dtype=bool)
+
+    if solid_blocks:
+        (solid, colors) = FindSolidBlocks(blocks)
+        if solid.any():
+            (solid_encoded, exact) = EncodeSolidBlocks(colors[solid], dest_format)
+            indices = np.nonzero(solid)[0][exact]
+            encoded[indices] = solid_encoded[exact]
+            pending[indices] = False
+
+    pending_blocks = blocks[pending]
+    inverse = None
+    if dedup_blocks and len(pending_blocks):
+        (unique_blocks, unique_inverse) = FindUniqueBlocks(pending_blocks)
+        if len(unique_blocks) < len(pending_blocks):
+            (pending_blocks, inverse) = (unique_blocks, unique_inverse)
+
+    if len(pending_blocks) == len(blocks):
+        return encode(input_image)
+    logger.debug('Encode {0} of {1} blocks directly, {2} repeated blocks'.format(
+        len(blocks) - pending.sum(), len(blocks), pending.sum() - len(pending_blocks)))
+
+    if len(pending_blocks):
+        (pending_encoded, failed_image) = _EncodePackedBlocks(pending_blocks, input_image, dest_format, encode)
+        if failed_image is not None:
+            return failed_image
+        encoded[pending] = pending_encoded if inverse is None else pending_encoded[inverse]
+    return _BlocksToImage(encoded, width, height, dest_format)
+
+# Re-encode only the blocks of input_image that differ from previous_image and
+# splice them into a copy of previous_output, the encoded previous_image.
+# encode(image) is the encoder of the packed changed blocks, it encodes the
+# whole image when the previous images do not match input_image.
+def ReencodeBlocks(input_image, previous_image, previous_output, dest_format, encode):
+    width = input_image.width
+    height = input_image.height
+    if (previous_image.width, previous_image.height, previous_image.internalformat) != \
+       (width, height, input_image.internalformat) or \
+       (previous_output.width, previous_output.height, previous_output.internalformat) != \
+       (width, height, dest_format) or \
+       previous_output.dataSize != GetImageSize(width, height, dest_format):
+        logger.warning('Previous images do not match the {0}x{1} input image, encode the whole image'.format(
+            width, height))
+        return encode(input_image)
+
+    blocks = GetPixelBlocks(input_image, dest_format)
+    changed = FindChangedBlocks(blocks, GetPixelBlocks(previous_image, dest_format))
+    encoded = UnpackBlocks(previous_output, len(blocks)).copy()
+    logger.debug('Re-encode {0} of {1} blocks'.format(changed.sum(), len(blocks)))
+
+    if changed.any():
+        (changed_encoded, failed_image) = _EncodePackedBlocks(blocks[changed], input_image, dest_format, encode)
+        if failed_image is not None:
+            return failed_image
+        encoded[changed] = changed_encoded
+    return _BlocksToImage(encoded, width, height, dest_format)
+
+# encode blocks of input_image packed into one image, return the encoded
+# blocks, or the image to return instead when the encoder fails
+def _EncodePackedBlocks(blocks, input_image, dest_format, encode):
+    output_image = encode(PackBlocks(blocks, input_image.internalformat))
+    if output_image.internalformat != dest_format:
+        return None, Image2D()
+    if output_image.IsEmpty():
+        return None, Image2D(width=input_image.width, height=input_image.height,
+            internalformat=dest_format,
+            dataSize=GetImageSize(input_image.width, input_image.height, dest_format))
+    return UnpackBlocks(output_image, len(blocks)), None
+
+def _BlocksToImage(encoded, width, height, dest_format):
+    (bwidth, bheight) = OGLCommon.GetBlockDimension(dest_format)
+    encoded = encoded.reshape(((height + bheight - 1) // bheight, (width + bwidth - 1) // bwidth, -1))
+    return Image2D.FromArray(encoded, dest_format, width, height)
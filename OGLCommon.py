@@ -139,24 +139,26 @@ ASTC_FORMAT_TO_BLOCK_DIMENSION = {
     OGLEnum.GL_COMPRESSED_RGBA_ASTC_12x10_KHR          : (12, 10),
     OGLEnum.GL_COMPRESSED_RGBA_ASTC_12x12_KHR          : (12, 12),
 
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_4x4_KHR    : (4, 4),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x4_KHR    : (5, 4),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x5_KHR    : (5, 5),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_6x5_KHR    : (6, 5),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_6x6_KHR    : (6, 6),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x5_KHR    : (8, 5),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x6_KHR    : (8, 6),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x8_KHR    : (8, 8),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x5_KHR   : (10, 5),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x6_KHR   : (10, 6),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x8_KHR   : (10, 8),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x10_KHR  : (10, 10),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x10_KHR  : (12, 10),
-    #OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x12_KHR  : (12, 12),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_4x4_KHR    : (4, 4),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x4_KHR    : (5, 4),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x5_KHR    : (5, 5),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_6x5_KHR    : (6, 5),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_6x6_KHR    : (6, 6),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x5_KHR    : (8, 5),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x6_KHR    : (8, 6),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_8x8_KHR    : (8, 8),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x5_KHR   : (10, 5),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x6_KHR   : (10, 6),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x8_KHR   : (10, 8),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_10x10_KHR  : (10, 10),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x10_KHR  : (12, 10),
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x12_KHR  : (12, 12),
 }
 
+# .astc files carry no color space, they map to the linear formats
 ASTC_FORMAT_FROM_BLOCK_DIMENSION = dict(
-    (dim, enum) for enum, dim in ASTC_FORMAT_TO_BLOCK_DIMENSION.items())
+    (dim, enum) for enum, dim in ASTC_FORMAT_TO_BLOCK_DIMENSION.items()
+    if enum <= OGLEnum.GL_COMPRESSED_RGBA_ASTC_12x12_KHR)
 
 def GetASTCCompressionImageSize(width, height, internalformat):
     if not IsASTCCompressionFormat(internalformat):
@@ -171,6 +173,26 @@ def IsASTCCompressionFormat(internalformat):
            OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_4x4_KHR <= internalformat \
         <= OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x12_KHR
 
+def IsASTCSRGBFormat(internalformat):
+    return OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_4x4_KHR <= internalformat \
+        <= OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_12x12_KHR
+
+def GetASTCDecodeFormat(internalformat):
+    if IsASTCSRGBFormat(internalformat):
+        return OGLEnum.GL_SRGB8_ALPHA8
+    return OGLEnum.GL_RGBA8
+
+# uncompressed format produced when decoding each ETC format
+ETC_DECODE_FORMAT = {
+    OGLEnum.GL_ETC1_RGB8_OES                             : OGLEnum.GL_RGB8,
+    OGLEnum.GL_COMPRESSED_RGB8_ETC2                      : OGLEnum.GL_RGB8,
+    OGLEnum.GL_COMPRESSED_SRGB8_ETC2                     : OGLEnum.GL_SRGB8,
+    OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2  : OGLEnum.GL_RGBA8,
+    OGLEnum.GL_COMPRESSED_SRGB8_PUNCHTHROUGH_ALPHA1_ETC2 : OGLEnum.GL_SRGB8_ALPHA8,
+    OGLEnum.GL_COMPRESSED_RGBA8_ETC2_EAC                 : OGLEnum.GL_RGBA8,
+    OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ETC2_EAC          : OGLEnum.GL_SRGB8_ALPHA8,
+}
+
 def IsCompressionFormat(internalformat):
     if internalformat in ETC_64BIT_FORMATS or \
        internalformat in ETC_128BIT_FORMATS or \
@@ -200,6 +222,7 @@ def GetSizedInternalFormat(glFormat, glType):
 def GetGLType(internalformat):
     mapping = {
         OGLEnum.GL_SRGB8        : OGLEnum.GL_UNSIGNED_BYTE,
+        OGLEnum.GL_SRGB8_ALPHA8 : OGLEnum.GL_UNSIGNED_BYTE,
         OGLEnum.GL_RGB8         : OGLEnum.GL_UNSIGNED_BYTE,
         OGLEnum.GL_RGBA8        : OGLEnum.GL_UNSIGNED_BYTE,
         OGLEnum.GL_RGB565       : OGLEnum.GL_UNSIGNED_SHORT_5_6_5,
@@ -256,6 +279,8 @@ def GetGLTypeNumpyType(glType):
 
 def GetGLFormat(internalformat):
     mapping = {
+        OGLEnum.GL_SRGB8        : OGLEnum.GL_RGB,
+        OGLEnum.GL_SRGB8_ALPHA8 : OGLEnum.GL_RGBA,
         OGLEnum.GL_RGB8         : OGLEnum.GL_RGB,
         OGLEnum.GL_RGB565       : OGLEnum.GL_RGB,
         OGLEnum.GL_RGBA8        : OGLEnum.GL_RGBA,
@@ -296,6 +321,22 @@ def GetPixelSize(internalformat):
     logger.error('unexpected internal format : {0}'.format(OGLEnum.names[internalformat]))
     return 0
 
+# return block footprint in pixels, (1, 1) for uncompressed formats
+def GetBlockDimension(internalformat):
+    if internalformat in ETC_64BIT_FORMATS or internalformat in ETC_128BIT_FORMATS:
+        return (4, 4)
+    if IsASTCCompressionFormat(internalformat):
+        return ASTC_FORMAT_TO_BLOCK_DIMENSION[internalformat]
+    return (1, 1)
+
+# return block size in bytes, pixel size for uncompressed formats
+def GetBlockSize(internalformat):
+    if internalformat in ETC_64BIT_FORMATS:
+        return 8
+    if internalformat in ETC_128BIT_FORMATS or IsASTCCompressionFormat(internalformat):
+        return 16
+    return GetPixelSize(internalformat)
+
 # return image size in bytes
 def GetImageSize(width, height, internalformat):
     if internalformat in ETC_64BIT_FORMATS:
@@ -0,0 +1,670 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+import OGLCommon
+from OGLCommon import OGLEnum
+
+# ETC1 / ETC2 / EAC block codec working on whole images at once,
+# every field of every block is extracted and evaluated as array operations
+
+ETC_BLOCK_DIMENSION = (4, 4)
+
+# intensity modifiers of ETC1 and the differential mode of ETC2, indexed by
+# [table codeword][pixel index], pixel index is (msb << 1) | lsb
+ETC_MODIFIER_TABLE = np.array([
+    [  2,   8,  -2,   -8],
+    [  5,  17,  -5,  -17],
+    [  9,  29,  -9,  -29],
+    [ 13,  42, -13,  -42],
+    [ 18,  60, -18,  -60],
+    [ 24,  80, -24,  -80],
+    [ 33, 106, -33, -106],
+    [ 47, 183, -47, -183],
+], dtype=np.int32)
+
+# punchthrough alpha blocks without the opaque bit use zero for the 'a' modifiers
+ETC_MODIFIER_TABLE_NON_OPAQUE = ETC_MODIFIER_TABLE * np.array([0, 1, 0, 1], dtype=np.int32)
+
+# distances used by the T and H modes of ETC2
+ETC2_DISTANCE_TABLE = np.array([3, 6, 11, 16, 23, 32, 41, 64], dtype=np.int32)
+
+# modifiers of EAC alpha blocks, indexed by [table index][pixel index]
+EAC_MODIFIER_TABLE = np.array([
+    [-3, -6, -9, -15, 2, 5, 8, 14],
+    [-3, -7, -10, -13, 2, 6, 9, 12],
+    [-2, -5, -8, -13, 1, 4, 7, 12],
+    [-2, -4, -6, -13, 1, 3, 5, 12],
+    [-3, -6, -8, -12, 2, 5, 7, 11],
+    [-3, -7, -9, -11, 2, 6, 8, 10],
+    [-4, -7, -8, -11, 3, 6, 7, 10],
+    [-3, -5, -8, -11, 2, 4, 7, 10],
+    [-2, -6, -8, -10, 1, 5, 7, 9],
+    [-2, -5, -8, -10, 1, 4, 7, 9],
+    [-2, -4, -8, -10, 1, 3, 7, 9],
+    [-2, -5, -7, -10, 1, 4, 6, 9],
+    [-3, -4, -7, -10, 2, 3, 6, 9],
+    [-1, -2, -3, -10, 0, 1, 2, 9],
+    [-4, -6, -8, -9, 3, 5, 7, 8],
+    [-3, -5, -7, -9, 2, 4, 6, 8],
+], dtype=np.int32)
+
+# pixels inside a block are stored column by column, PIXEL_ORDER[y, x] is the
+# position of pixel (x, y) in the index bit fields
+PIXEL_ORDER = np.arange(16).reshape((4, 4)).T
+PIXEL_X = np.tile(np.arange(4), (4, 1))
+PIXEL_Y = PIXEL_X.T
+
+PUNCHTHROUGH_FORMATS = (
+    OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2,
+    OGLEnum.GL_COMPRESSED_SRGB8_PUNCHTHROUGH_ALPHA1_ETC2,
+)
+
+def _Bits(word, high, low):
+    return (word >> low) & ((1 << (high - low + 1)) - 1)
+
+def _Extend4(value):
+    return (value << 4) | value
+
+def _Extend5(value):
+    return (value << 3) | (value >> 2)
+
+def _Extend6(value):
+    return (value << 2) | (value >> 4)
+
+def _Extend7(value):
+    return (value << 1) | (value >> 6)
+
+def _SignExtend3(value):
+    return value - ((value & 0x4) << 1)
+
+def _PixelIndices(low_word):
+    # (block count, 4, 4) array of 2-bit pixel indices, indexed by [block, y, x]
+    word = low_word[:, None, None]
+    lsb = (word >> PIXEL_ORDER) & 1
+    msb = (word >> (PIXEL_ORDER + 16)) & 1
+    return (msb << 1) | lsb
+
+def _PaintColors(paint, indices):
+    # pick one of the four paint colors (block count, 4, 3) for every pixel
+    return paint[np.arange(len(paint))[:, None, None], indices]
+
+def _DecodeIndividualOrDifferential(high, low, base1, base2, modifier_table):
+    flip = high & 1
+    table1 = _Bits(high, 7, 5)
+    table2 = _Bits(high, 4, 2)
+    second = np.where(flip[:, None, None], PIXEL_Y >= 2, PIXEL_X >= 2)
+    indices = _PixelIndices(low)
+    table = np.where(second, table2[:, None, None], table1[:, None, None])
+    base = np.where(second[..., None], base2[:, None, None, :], base1[:, None, None, :])
+    modifier = modifier_table[table, indices]
+    return np.clip(base + modifier[..., None], 0, 255), indices
+
+def _DecodeTMode(high, low):
+    red1 = (_Bits(high, 28, 27) << 2) | _Bits(high, 25, 24)
+    green1 = _Bits(high, 23, 20)
+    blue1 = _Bits(high, 19, 16)
+    red2 = _Bits(high, 15, 12)
+    green2 = _Bits(high, 11, 8)
+    blue2 = _Bits(high, 7, 4)
+    distance = ETC2_DISTANCE_TABLE[(_Bits(high, 3, 2) << 1) | (high & 1)]
+
+    color1 = _Extend4(np.column_stack((red1, green1, blue1)))
+    color2 = _Extend4(np.column_stack((red2, green2, blue2)))
+    distance = distance[:, None]
+    paint = np.stack((color1,
+        np.clip(color2 + distance, 0, 255),
+        color2,
+        np.clip(color2 - distance, 0, 255)), axis=1)
+    indices = _PixelIndices(low)
+    return _PaintColors(paint, indices), indices
+
+def _DecodeHMode(high, low):
+    red1 = _Bits(high, 30, 27)
+    green1 = (_Bits(high, 26, 24) << 1) | _Bits(high, 20, 20)
+    blue1 = (_Bits(high, 19, 19) << 3) | _Bits(high, 17, 15)
+    red2 = _Bits(high, 14, 11)
+    green2 = _Bits(high, 10, 7)
+    blue2 = _Bits(high, 6, 3)
+
+    # the lowest bit of the distance index is implied by the order of the two colors
+    value1 = (red1 << 8) | (green1 << 4) | blue1
+    value2 = (red2 << 8) | (green2 << 4) | blue2
+    distance_index = (_Bits(high, 2, 2) << 2) | ((high & 1) << 1) | (value1 >= value2)
+    distance = ETC2_DISTANCE_TABLE[distance_index][:, None]
+
+    color1 = _Extend4(np.column_stack((red1, green1, blue1)))
+    color2 = _Extend4(np.column_stack((red2, green2, blue2)))
+    paint = np.clip(np.stack((color1 + distance,
+        color1 - distance,
+        color2 + distance,
+        color2 - distance), axis=1), 0, 255)
+    indices = _PixelIndices(low)
+    return _PaintColors(paint, indices), indices
+
+def _DecodePlanarMode(high, low):
+    red_o = _Bits(high, 30, 25)
+    green_o = (_Bits(high, 24, 24) << 6) | _Bits(high, 22, 17)
+    blue_o = (_Bits(high, 16, 16) << 5) | (_Bits(high, 12, 11) << 3) | _Bits(high, 9, 7)
+    red_h = (_Bits(high, 6, 2) << 1) | (high & 1)
+    green_h = _Bits(low, 31, 25)
+    blue_h = _Bits(low, 24, 19)
+    red_v = _Bits(low, 18, 13)
+    green_v = _Bits(low, 12, 6)
+    blue_v = _Bits(low, 5, 0)
+
+    origin = np.column_stack((_Extend6(red_o), _Extend7(green_o), _Extend6(blue_o)))
+    horizontal = np.column_stack((_Extend6(red_h), _Extend7(green_h), _Extend6(blue_h)))
+    vertical = np.column_stack((_Extend6(red_v), _Extend7(green_v), _Extend6(blue_v)))
+
+    origin = origin[:, None, None, :]
+    color = (PIXEL_X[..., None] * (horizontal[:, None, None, :] - origin) +
+        PIXEL_Y[..., None] * (vertical[:, None, None, :] - origin) +
+        4 * origin + 2) >> 2
+    return np.clip(color, 0, 255)
+
+def _DecodeColorBlocks(high, low, etc1=False, punchthrough=False):
+    count = len(high)
+    colors = np.zeros((count, 4, 4, 3), dtype=np.int64)
+    opaque = np.ones((count, 4, 4), dtype=bool)
+
+    # punchthrough blocks reuse the diff bit as opaque flag and are always differential
+    diff_bit = _Bits(high, 1, 1).astype(bool)
+    if punchthrough:
+        differential = np.ones(count, dtype=bool)
+        non_opaque = ~diff_bit
+    else:
+        differential = diff_bit
+        non_opaque = np.zeros(count, dtype=bool)
+
+    individual = ~differential
+    if individual.any():
+        h, l = high[individual], low[individual]
+        base1 = _Extend4(np.column_stack((_Bits(h, 31, 28), _Bits(h, 23, 20), _Bits(h, 15, 12))))
+        base2 = _Extend4(np.column_stack((_Bits(h, 27, 24), _Bits(h, 19, 16), _Bits(h, 11, 8))))
+        colors[individual], _ = _DecodeIndividualOrDifferential(h, l, base1, base2, ETC_MODIFIER_TABLE)
+
+    base = np.column_stack((_Bits(high, 31, 27), _Bits(high, 23, 19), _Bits(high, 15, 11)))
+    delta = _SignExtend3(np.column_stack((_Bits(high, 26, 24), _Bits(high, 18, 16), _Bits(high, 10, 8))))
+    second = base + delta
+    overflow = (second < 0) | (second > 31)
+
+    if etc1:
+        t_mode = h_mode = planar_mode = np.zeros(count, dtype=bool)
+    else:
+        t_mode = differential & overflow[:, 0]
+        h_mode = differential & ~overflow[:, 0] & overflow[:, 1]
+        planar_mode = differential & ~overflow[:, 0] & ~overflow[:, 1] & overflow[:, 2]
+    diff_mode = differential & ~t_mode & ~h_mode & ~planar_mode
+
+    if diff_mode.any():
+        h, l = high[diff_mode], low[diff_mode]
+        base1 = _Extend5(base[diff_mode])
+        # only reached by ETC1 when it overflows, wrap around like a 5-bit adder
+        base2 = _Extend5(second[diff_mode] & 0x1F)
+        transparent = non_opaque[diff_mode]
+        result, indices = _DecodeIndividualOrDifferential(h, l, base1, base2, ETC_MODIFIER_TABLE)
+        if transparent.any():
+            result[transparent], indices[transparent] = _DecodeIndividualOrDifferential(
+                h[transparent], l[transparent], base1[transparent], base2[transparent],
+                ETC_MODIFIER_TABLE_NON_OPAQUE)
+        colors[diff_mode] = result
+        opaque[diff_mode] = ~(transparent[:, None, None] & (indices == 2))
+
+    for mode, decode in ((t_mode, _DecodeTMode), (h_mode, _DecodeHMode)):
+        if mode.any():
+            result, indices = decode(high[mode], low[mode])
+            colors[mode] = result
+            opaque[mode] = ~(non_opaque[mode][:, None, None] & (indices == 2))
+
+    if planar_mode.any():
+        colors[planar_mode] = _DecodePlanarMode(high[planar_mode], low[planar_mode])
+
+    # transparent punchthrough pixels are black
+    colors[~opaque] = 0
+    return colors, opaque
+
+def _DecodeAlphaBlocks(high, low):
+    base = _Bits(high, 31, 24)
+    multiplier = _Bits(high, 23, 20)
+    table = _Bits(high, 19, 16)
+
+    # the 48 index bits span both words, pixel n uses bits (47 - 3n)..(45 - 3n)
+    index_bits = (high & 0xFFFF) << 32 | low
+    shifts = 45 - 3 * PIXEL_ORDER
+    indices = (index_bits[:, None, None] >> shifts) & 0x7
+    modifier = EAC_MODIFIER_TABLE[table[:, None, None], indices]
+    alpha = base[:, None, None] + modifier * multiplier[:, None, None]
+    return np.clip(alpha, 0, 255)
+
+def _BlocksToImage(blocks, width, height):
+    # (block count, 4, 4, channels) -> (height, width, channels)
+    bwidth, bheight = ETC_BLOCK_DIMENSION
+    xblocks = (width + bwidth - 1) // bwidth
+    yblocks = (height + bheight - 1) // bheight
+    channels = blocks.shape[-1]
+    image = blocks.reshape((yblocks, xblocks, bheight, bwidth, channels)) \
+        .transpose((0, 2, 1, 3, 4)) \
+        .reshape((yblocks * bheight, xblocks * bwidth, channels))
+    return image[:height, :width]
+
+def IsETCCompressionFormat(internalformat):
+    return internalformat in OGLCommon.ETC_64BIT_FORMATS or \
+        internalformat in OGLCommon.ETC_128BIT_FORMATS
+
+# Decode ETC1 / ETC2 / EAC compressed data into a (height, width, channels)
+# uint8 array, the uncompressed format is given by ETC_DECODE_FORMAT
+def DecodeETC(data, width, height, internalformat):
+    words = np.frombuffer(data, dtype='>u4',
+        count=OGLCommon.GetImageSize(width, height, internalformat) // 4).astype(np.int64)
+
+    if internalformat in OGLCommon.ETC_128BIT_FORMATS:
+        words = words.reshape((-1, 4))
+        alpha = _DecodeAlphaBlocks(words[:, 0], words[:, 1])
+        colors, _ = _DecodeColorBlocks(words[:, 2], words[:, 3])
+        blocks = np.concatenate((colors, alpha[..., None]), axis=-1)
+    else:
+        words = words.reshape((-1, 2))
+        colors, opaque = _DecodeColorBlocks(words[:, 0], words[:, 1],
+            etc1=(internalformat == OGLEnum.GL_ETC1_RGB8_OES),
+            punchthrough=(internalformat in PUNCHTHROUGH_FORMATS))
+        if internalformat in PUNCHTHROUGH_FORMATS:
+            blocks = np.concatenate((colors, opaque[..., None] * 255), axis=-1)
+        else:
+            blocks = colors
+
+    return _BlocksToImage(blocks.astype(np.uint8), width, height)
+
+# Encoding
+
+# 'fast' fits the rounded base colors of every mode, 'quality' then refines
+# the best of those modes over the neighbouring base colors and adds the T and
+# H modes of ETC2, about 3 (ETC1) to 5 (ETC2) times the time of 'fast'
+ETC_EFFORT_LEVELS = ('fast', 'quality')
+
+ETC_ENCODE_FORMATS = (
+    OGLEnum.GL_ETC1_RGB8_OES,
+    OGLEnum.GL_COMPRESSED_RGB8_ETC2,
+    OGLEnum.GL_COMPRESSED_SRGB8_ETC2,
+)
+
+# blocks encoded per pass, bounds the size of the candidate error arrays
+ETC_ENCODE_CHUNK = 4096
+
+# block pixel positions (pixel (x, y) is y * 4 + x) of the two subblocks for flip 0 and 1
+ETC_SUBBLOCKS = (
+    (np.array([y * 4 + x for y in range(4) for x in range(2)]),
+     np.array([y * 4 + x for y in range(4) for x in range(2, 4)])),
+    (np.array([y * 4 + x for y in range(2) for x in range(4)]),
+     np.array([y * 4 + x for y in range(2, 4) for x in range(4)])),
+)
+
+def _ImageToBlocks(pixels):
+    # (height, width, 3) -> (block count, 16, 3), partial blocks repeat the edge pixels
+    height, width = pixels.shape[:2]
+    bwidth, bheight = ETC_BLOCK_DIMENSION
+    xblocks = (width + bwidth - 1) // bwidth
+    yblocks = (height + bheight - 1) // bheight
+    padded = np.pad(pixels, ((0, yblocks * bheight - height), (0, xblocks * bwidth - width), (0, 0)), mode='edge')
+    return padded.reshape((yblocks, bheight, xblocks, bwidth, -1)) \
+        .transpose((0, 2, 1, 3, 4)) \
+        .reshape((yblocks * xblocks, bheight * bwidth, -1)).astype(np.int64)
+
+def _PackIndices(indices):
+    # (block count, 16) pixel indices in block order -> low word
+    positions = PIXEL_ORDER.ravel()
+    return ((indices & 1) << positions).sum(axis=1) | ((indices >> 1) << (positions + 16)).sum(axis=1)
+
+def _QuantizeCandidates(color, levels, quality):
+    # quantized base colors to try, rounded first, then every floor/ceil combination
+    scaled = color * levels / 255.
+    candidates = [np.clip(np.rint(scaled), 0, levels).astype(np.int64)]
+    if quality:
+        low = np.clip(np.floor(scaled), 0, levels).astype(np.int64)
+        high = np.clip(low + 1, 0, levels)
+        for combination in range(8):
+            select = np.array([(combination >> channel) & 1 for channel in range(3)], dtype=bool)
+            candidates.append(np.where(select, high, low))
+    return candidates
+
+def _FitSubblock(pixels, base):
+    # best modifier table and pixel indices of a subblock (block count, 8, 3)
+    # around the base color (block count, 3), returns (error, table, indices),
+    # errors of 8 pixels fit in int32 which halves the size of the error array
+    candidates = np.clip(base[:, None, None, :] + ETC_MODIFIER_TABLE[None, :, :, None], 0, 255).astype(np.int32)
+    differences = pixels.astype(np.int32)[:, :, None, None, :] - candidates[:, None]
+    differences *= differences
+    errors = differences[..., 0] + differences[..., 1] + differences[..., 2]
+    indices = errors.argmin(axis=-1)
+    table_errors = np.take_along_axis(errors, indices[..., None], axis=-1)[..., 0].sum(axis=1)
+    table = table_errors.argmin(axis=1)
+    rows = np.arange(len(pixels))
+    return table_errors[rows, table].astype(np.int64), table, indices[rows, :, table]
+
+def _BestSubblockFit(pixels, candidates, extend):
+    # try every quantized candidate, returns (error, quantized color, table, indices)
+    best = None
+    for quantized in candidates:
+        error, table, indices = _FitSubblock(pixels, extend(quantized))
+        if best is None:
+            best = [error, quantized, table, indices]
+            continue
+        better = error < best[0]
+        best[0] = np.where(better, error, best[0])
+        best[1] = np.where(better[:, None], quantized, best[1])
+        best[2] = np.where(better, table, best[2])
+        best[3] = np.where(better[:, None], indices, best[3])
+    return best
+
+def _EncodeIndividualOrDifferential(blocks, flip, differential, quality):
+    # returns (error, high word, low word)
+    count = len(blocks)
+    first, second = ETC_SUBBLOCKS[flip]
+    indices = np.zeros((count, 16), dtype=np.int64)
+
+    if differential:
+        levels, extend = 31, _Extend5
+    else:
+        levels, extend = 15, _Extend4
+    fits = []
+    for subblock in (first, second):
+        pixels = blocks[:, subblock]
+        candidates = _QuantizeCandidates(pixels.mean(axis=1), levels, quality)
+        fits.append((pixels, candidates, _BestSubblockFit(pixels, candidates, extend)))
+
+    (pixels1, candidates1, fit1), (pixels2, candidates2, fit2) = fits
+    error = fit1[0] + fit2[0]
+    color1, color2 = fit1[1], fit2[1]
+    table1, table2 = fit1[2], fit2[2]
+    indices[:, first], indices[:, second] = fit1[3], fit2[3]
+
+    if differential:
+        delta = color2 - color1
+        valid = ((delta >= -4) & (delta <= 3)).all(axis=1)
+        if quality:
+            # subblocks refined apart may drift too far, fall back to the rounded pair
+            rounded1 = _FitSubblock(pixels1, extend(candidates1[0]))
+            rounded2 = _FitSubblock(pixels2, extend(candidates2[0]))
+            delta_rounded = candidates2[0] - candidates1[0]
+            valid_rounded = ((delta_rounded >= -4) & (delta_rounded <= 3)).all(axis=1)
+            fallback = ~valid & valid_rounded
+            error = np.where(fallback, rounded1[0] + rounded2[0], error)
+            color1 = np.where(fallback[:, None], candidates1[0], color1)
+            color2 = np.where(fallback[:, None], candidates2[0], color2)
+            table1 = np.where(fallback, rounded1[1], table1)
+            table2 = np.where(fallback, rounded2[1], table2)
+            rows = np.nonzero(fallback)[0][:, None]
+            indices[rows, first] = rounded1[2][rows[:, 0]]
+            indices[rows, second] = rounded2[2][rows[:, 0]]
+            valid |= valid_rounded
+            delta = color2 - color1
+        error = np.where(valid, error, np.iinfo(np.int64).max)
+        delta &= 7
+        high = (color1[:, 0] << 27) | (delta[:, 0] << 24) | \
+            (color1[:, 1] << 19) | (delta[:, 1] << 16) | \
+            (color1[:, 2] << 11) | (delta[:, 2] << 8) | (1 << 1)
+    else:
+        high = (color1[:, 0] << 28) | (color2[:, 0] << 24) | \
+            (color1[:, 1] << 20) | (color2[:, 1] << 16) | \
+            (color1[:, 2] << 12) | (color2[:, 2] << 8)
+    high |= (table1 << 5) | (table2 << 2) | flip
+    return error, high, _PackIndices(indices)
+
+def _ForceOverflow(low_pair, high_pair):
+    # free bits (3 high bits of the base, top bit of the delta) making a
+    # base + delta field overflow, given the two fixed 2-bit fields inside it
+    large = (low_pair + high_pair) >= 4
+    return np.where(large, 7, 0), np.where(large, 0, 1)
+
+def _EncodePlanar(blocks):
+    # least squares fit of the origin, horizontal and vertical colors
+    x = np.tile(np.arange(4), 4)
+    y = np.repeat(np.arange(4), 4)
+    mean = blocks.mean(axis=1)
+    slope_x = ((x - 1.5)[None, :, None] * blocks).sum(axis=1) / 20.
+    slope_y = ((y - 1.5)[None, :, None] * blocks).sum(axis=1) / 20.
+    origin = mean - 1.5 * slope_x - 1.5 * slope_y
+    limits = np.array([63, 127, 63])
+    quantize = lambda color: np.clip(np.rint(color * limits / 255.), 0, limits).astype(np.int64)
+    o, h, v = quantize(origin), quantize(origin + 4 * slope_x), quantize(origin + 4 * slope_y)
+
+    high = (o[:, 0] << 25) | ((o[:, 1] >> 6) << 24) | ((o[:, 1] & 0x3F) << 17) | \
+        ((o[:, 2] >> 5) << 16) | (((o[:, 2] >> 3) & 3) << 11) | ((o[:, 2] & 7) << 7) | \
+        ((h[:, 0] >> 1) << 2) | (1 << 1) | (h[:, 0] & 1)
+    low = (h[:, 1] << 25) | (h[:, 2] << 19) | (v[:, 0] << 13) | (v[:, 1] << 6) | v[:, 2]
+
+    # red and green must not overflow, blue must
+    red = _Bits(high, 30, 27)
+    green = _Bits(high, 22, 19)
+    high |= ((red + _SignExtend3(_Bits(high, 26, 24))) < 0) << 31
+    high |= ((green + _SignExtend3(_Bits(high, 18, 16))) < 0) << 23
+    base_bits, delta_bit = _ForceOverflow((o[:, 2] >> 3) & 3, (o[:, 2] >> 1) & 3)
+    high |= (base_bits << 13) | (delta_bit << 10)
+
+    decoded = _DecodePlanarMode(high, low).reshape((-1, 16, 3))
+    return ((decoded - blocks) ** 2).sum(axis=(1, 2)), high, low
+
+def _SplitColors(blocks):
+    # split the pixels of every block in two groups along the principal axis,
+    # returns the 4-bit quantized mean color of each group
+    mean = blocks.mean(axis=1)
+    centered = blocks - mean[:, None, :]
+    covariance = np.einsum('npi,npj->nij', centered, centered)
+    axis = np.ones((len(blocks), 3))
+    for _ in range(4):
+        axis = np.einsum('nij,nj->ni', covariance, axis)
+        axis /= np.maximum(np.abs(axis).max(axis=1), 1e-6)[:, None]
+    side = np.einsum('npi,ni->np', centered, axis) > 0
+    colors = []
+    for group in (side, ~side):
+        size = group.sum(axis=1)[:, None]
+        group_mean = np.where(size > 0, (blocks * group[..., None]).sum(axis=1) / np.maximum(size, 1), mean)
+        colors.append(np.clip(np.rint(group_mean * 15 / 255.), 0, 15).astype(np.int64))
+    return colors
+
+def _FitPaintColors(blocks, paint):
+    # paint (block count, candidates, 4, 3) -> (error, pixel indices) per candidate
+    errors = ((blocks[:, None, :, None, :] - paint[:, :, None, :, :]) ** 2).sum(axis=-1)
+    return errors.min(axis=-1).sum(axis=-1), errors.argmin(axis=-1)
+
+def _EncodeTMode(blocks, color_a, color_b):
+    best = None
+    distance = ETC2_DISTANCE_TABLE[None, :, None]
+    for single, other in ((color_a, color_b), (color_b, color_a)):
+        c1 = _Extend4(single)[:, None, :]
+        c2 = _Extend4(other)[:, None, :]
+        c1 = np.repeat(c1, len(ETC2_DISTANCE_TABLE), axis=1)
+        paint = np.stack((c1,
+            np.clip(c2 + distance, 0, 255),
+            np.repeat(c2, len(ETC2_DISTANCE_TABLE), axis=1),
+            np.clip(c2 - distance, 0, 255)), axis=2)
+        errors, indices = _FitPaintColors(blocks, paint)
+        choice = errors.argmin(axis=1)
+        rows = np.arange(len(blocks))
+        candidate = (errors[rows, choice], single, other, choice, indices[rows, choice])
+        if best is None:
+            best = list(candidate)
+        else:
+            better = candidate[0] < best[0]
+            for index, value in enumerate(candidate):
+                mask = better.reshape((-1, ) + (1, ) * (np.ndim(value) - 1))
+                best[index] = np.where(mask, value, best[index])
+
+    error, c1, c2, choice, indices = best
+    high = ((c1[:, 0] >> 2) << 27) | ((c1[:, 0] & 3) << 24) | (c1[:, 1] << 20) | (c1[:, 2] << 16) | \
+        (c2[:, 0] << 12) | (c2[:, 1] << 8) | (c2[:, 2] << 4) | \
+        ((choice >> 1) << 2) | (1 << 1) | (choice & 1)
+    # red must overflow
+    base_bits, delta_bit = _ForceOverflow(c1[:, 0] >> 2, c1[:, 0] & 3)
+    high |= (base_bits << 29) | (delta_bit << 26)
+    return error, high, _PackIndices(indices)
+
+def _EncodeHMode(blocks, color_a, color_b):
+    count = len(blocks)
+    value_a = (color_a[:, 0] << 8) | (color_a[:, 1] << 4) | color_a[:, 2]
+    value_b = (color_b[:, 0] << 8) | (color_b[:, 1] << 4) | color_b[:, 2]
+    choices = np.arange(len(ETC2_DISTANCE_TABLE))
+
+    # the lowest distance bit is implied by the color order, swap the colors to match it
+    keep = (choices[None, :] & 1) == (value_a >= value_b)[:, None]
+    c1 = np.where(keep[..., None], color_a[:, None, :], color_b[:, None, :])
+    c2 = np.where(keep[..., None], color_b[:, None, :], color_a[:, None, :])
+    distance = ETC2_DISTANCE_TABLE[None, :, None]
+    e1, e2 = _Extend4(c1), _Extend4(c2)
+    paint = np.clip(np.stack((e1 + distance, e1 - distance, e2 + distance, e2 - distance), axis=2), 0, 255)
+    errors, indices = _FitPaintColors(blocks, paint)
+    # equal colors always imply an odd distance
+    errors = np.where(((value_a == value_b)[:, None]) & (choices[None, :] & 1 == 0),
+        np.iinfo(np.int64).max, errors)
+
+    rows = np.arange(count)
+    choice = errors.argmin(axis=1)
+    error = errors[rows, choice]
+    c1, c2, indices = c1[rows, choice], c2[rows, choice], indices[rows, choice]
+
+    high = (c1[:, 0] << 27) | ((c1[:, 1] >> 1) << 24) | ((c1[:, 1] & 1) << 20) | \
+        ((c1[:, 2] >> 3) << 19) | ((c1[:, 2] & 7) << 15) | \
+        (c2[:, 0] << 11) | (c2[:, 1] << 7) | (c2[:, 2] << 3) | \
+        ((choice >> 2) << 2) | (1 << 1) | ((choice >> 1) & 1)
+    # red must not overflow, green must
+    high |= ((c1[:, 0] + _SignExtend3(c1[:, 1] >> 1)) < 0) << 31
+    base_bits, delta_bit = _ForceOverflow(((c1[:, 1] & 1) << 1) | (c1[:, 2] >> 3), (c1[:, 2] >> 1) & 3)
+    high |= (base_bits << 21) | (delta_bit << 18)
+    return error, high, _PackIndices(indices)
+
+def _EncodeColorBlocks(blocks, etc2, quality):
+    modes = [(flip, differential) for flip in (0, 1) for differential in (False, True)]
+    candidates = [_EncodeIndividualOrDifferential(blocks, flip, differential, False)
+        for flip, differential in modes]
+    if quality:
+        # only the blocks a mode fits best are refined in that mode, the
+        # refined search includes the rounded colors so errors never grow
+        errors = np.column_stack([candidate[0] for candidate in candidates])
+        best = errors.min(axis=1)
+        for mode, (flip, differential) in enumerate(modes):
+            refine = errors[:, mode] == best
+            refined = _EncodeIndividualOrDifferential(blocks[refine], flip, differential, True)
+            candidate = [values.copy() for values in candidates[mode]]
+            for values, refined_values in zip(candidate, refined):
+                values[refine] = refined_values
+            candidates[mode] = candidate
+    if etc2:
+        candidates.append(_EncodePlanar(blocks))
+        if quality:
+            color_a, color_b = _SplitColors(blocks)
+            candidates.append(_EncodeTMode(blocks, color_a, color_b))
+            candidates.append(_EncodeHMode(blocks, color_a, color_b))
+
+    errors = np.column_stack([candidate[0] for candidate in candidates])
+    choice = errors.argmin(axis=1)
+    rows = np.arange(len(blocks))
+    high = np.column_stack([candidate[1] for candidate in candidates])[rows, choice]
+    low = np.column_stack([candidate[2] for candidate in candidates])[rows, choice]
+    return high, low
+
+# Encode a (height, width, 3) uint8 array into ETC1 / ETC2 RGB blocks,
+# effort is one of ETC_EFFORT_LEVELS
+def EncodeETC(pixels, internalformat, effort='fast'):
+    if internalformat not in ETC_ENCODE_FORMATS:
+        logger.error('EncodeETC, unexpected internalformat ({0})'.format(OGLEnum.names[internalformat]))
+        return ''
+    if effort not in ETC_EFFORT_LEVELS:
+        logger.error('EncodeETC, unexpected effort ({0}), use {1}'.format(effort, ETC_EFFORT_LEVELS[0]))
+        effort = ETC_EFFORT_LEVELS[0]
+
+    etc2 = internalformat != OGLEnum.GL_ETC1_RGB8_OES
+    quality = effort == 'quality'
+    blocks = _ImageToBlocks(pixels)
+    words = np.zeros((len(blocks), 2), dtype=np.int64)
+    for start in range(0, len(blocks), ETC_ENCODE_CHUNK):
+        chunk = slice(start, start + ETC_ENCODE_CHUNK)
+        words[chunk, 0], words[chunk, 1] = _EncodeColorBlocks(blocks[chunk], etc2, quality)
+    return words.astype('>u4').tostring()
+
+# Solid color blocks
+
+# every format has a solid block encoding, it is used for the colors it
+# reproduces exactly, punchthrough only for alpha 0 or 255
+ETC_SOLID_FORMATS = OGLCommon.ETC_64BIT_FORMATS + OGLCommon.ETC_128BIT_FORMATS
+
+# EAC pixel indices (index 4 of every table is +0 in table 13) of solid alpha blocks
+EAC_SOLID_TABLE = 13
+EAC_SOLID_INDICES = sum(4 << (45 - 3 * pixel) for pixel in range(16))
+
+_solid_fits = {}
+
+def _SolidFit(levels, extend):
+    # for every modifier (table * 4 + index) and 8-bit value, the quantized
+    # base painting the closest value and its squared error, (32, 256) each
+    if levels not in _solid_fits:
+        bases = extend(np.arange(levels + 1))
+        painted = np.clip(bases[None, :, None] + ETC_MODIFIER_TABLE.reshape((-1, 1, 1)), 0, 255)
+        errors = (painted - np.arange(256)[None, None, :]) ** 2
+        _solid_fits[levels] = (errors.argmin(axis=1), errors.min(axis=1))
+    return _solid_fits[levels]
+
+def _EncodeSolidColors(colors, differential):
+    # both subblocks use the same base and every pixel the same modifier,
+    # returns (error, high word, low word)
+    if differential:
+        levels, extend = 31, _Extend5
+    else:
+        levels, extend = 15, _Extend4
+    best_base, best_error = _SolidFit(levels, extend)
+    errors = best_error[:, colors].sum(axis=-1)
+    modifier = errors.argmin(axis=0)
+    base = best_base[modifier[:, None], colors]
+    table, index = modifier >> 2, modifier & 3
+
+    if differential:
+        high = (base[:, 0] << 27) | (base[:, 1] << 19) | (base[:, 2] << 11) | (1 << 1)
+    else:
+        high = (base[:, 0] << 28) | (base[:, 0] << 24) | \
+            (base[:, 1] << 20) | (base[:, 1] << 16) | \
+            (base[:, 2] << 12) | (base[:, 2] << 8)
+    high |= (table << 5) | (table << 2)
+    low = np.where(index & 1, 0xFFFF, 0) | np.where(index >> 1, 0xFFFF0000, 0)
+    return errors[modifier, np.arange(len(colors))] * 16, high, low
+
+# Encode solid color blocks, colors is a (block count, channels) uint8 array
+# in ETC_DECODE_FORMAT, returns the (block count, block size) uint8 blocks and
+# which of them decode to exactly the color, only those can be used
+def EncodeETCSolidBlocks(colors, internalformat):
+    colors = colors.astype(np.int64)
+    rgb = colors[:, :3]
+    punchthrough = internalformat in PUNCHTHROUGH_FORMATS
+    candidates = [_EncodeSolidColors(rgb, True)]
+    if not punchthrough:
+        candidates.append(_EncodeSolidColors(rgb, False))
+    if internalformat != OGLEnum.GL_ETC1_RGB8_OES:
+        blocks = np.repeat(rgb[:, None, :], 16, axis=1)
+        candidates.append(_EncodePlanar(blocks))
+        color_a, color_b = _SplitColors(blocks)
+        candidates.append(_EncodeTMode(blocks, color_a, color_b))
+        candidates.append(_EncodeHMode(blocks, color_a, color_b))
+
+    errors = np.column_stack([candidate[0] for candidate in candidates])
+    choice = errors.argmin(axis=1)
+    rows = np.arange(len(colors))
+    high = np.column_stack([candidate[1] for candidate in candidates])[rows, choice]
+    low = np.column_stack([candidate[2] for candidate in candidates])[rows, choice]
+    decoded, opaque = _DecodeColorBlocks(high, low,
+        etc1=(internalformat == OGLEnum.GL_ETC1_RGB8_OES), punchthrough=punchthrough)
+    handled = (decoded == rgb[:, None, None, :]).all(axis=(1, 2, 3))
+
+    if punchthrough:
+        # transparent blocks are non-opaque with the transparent index everywhere
+        transparent = colors[:, 3] == 0
+        high = np.where(transparent, 0, high)
+        low = np.where(transparent, 0xFFFF0000, low)
+        handled = transparent | (handled & opaque.all(axis=(1, 2)) & (colors[:, 3] == 255))
+        words = np.column_stack((high, low))
+    elif internalformat in OGLCommon.ETC_128BIT_FORMATS:
+        alpha_high = (colors[:, 3] << 24) | (1 << 20) | (EAC_SOLID_TABLE << 16) | (EAC_SOLID_INDICES >> 32)
+        alpha_low = np.empty_like(alpha_high)
+        alpha_low.fill(EAC_SOLID_INDICES & 0xFFFFFFFF)
+        words = np.column_stack((alpha_high, alpha_low, high, low))
+    else:
+        words = np.column_stack((high, low))
+    return words.astype('>u4').view(np.uint8).reshape((len(colors), -1)), handled
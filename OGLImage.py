@@ -1,10 +1,26 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import OGLCommon
 from OGLCommon import OGLEnum
+from UtilCommon import LazyModule
 
+np = LazyModule('numpy')
+
+# flat uint8 view over any buffer object (str, bytearray, buffer, memoryview, ndarray)
+def _ByteView(data):
+    if isinstance(data, memoryview):
+        data = np.asarray(data)
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+# data can be any object exporting the buffer interface, it is kept as given
+# so that mapped files and NumPy arrays are never copied implicitly
 class Image2D(object):
 
+    __slots__ = ('width', 'height', 'internalformat', 'dataSize', 'data')
+
     def __init__(self, width=0, height=0,
         internalformat=OGLEnum.GL_NONE,
         dataSize=0, data=''):
@@ -18,6 +34,49 @@ class Image2D(object):
         return 'Image2D : dimension({0}x{1}), internalformat({2}), dataSize({3})' \
             .format(self.width, self.height, OGLEnum.names[self.internalformat], self.dataSize)
 
+    # buffers and mappings cannot be pickled, the data travels as a string
+    def __getstate__(self):
+        return (self.width, self.height, self.internalformat, self.dataSize, self.ToBytes())
+
+    def __setstate__(self, state):
+        (self.width, self.height, self.internalformat, self.dataSize, self.data) = state
+
     def IsEmpty(self):
         return (not self.width) or (not self.height) or \
-            (not self.dataSize) or (not self.data)
+            (not self.dataSize) or (self.data is None) or (not len(self.data))
+
+    # data as a string, only copied when it is not a string already
+    def ToBytes(self):
+        if isinstance(self.data, str):
+            return self.data
+        if hasattr(self.data, 'tobytes'):
+            return self.data.tobytes()
+        return str(self.data)
+
+    # NumPy view sharing memory with data, (height, width, element count) of
+    # the GL type for uncompressed formats and (block rows, blocks per row,
+    # block size) bytes for compressed ones, read-only for immutable data
+    def AsArray(self):
+        if OGLCommon.IsCompressionFormat(self.internalformat):
+            (bwidth, bheight) = OGLCommon.GetBlockDimension(self.internalformat)
+            shape = ((self.height + bheight - 1) // bheight,
+                (self.width + bwidth - 1) // bwidth,
+                OGLCommon.GetBlockSize(self.internalformat))
+            dtype = np.uint8
+        else:
+            shape = (self.height, self.width, OGLCommon.GetElementCount(self.internalformat))
+            dtype = OGLCommon.GetGLTypeNumpyType(OGLCommon.GetGLType(self.internalformat))
+        return _ByteView(self.data).view(dtype).reshape(shape)
+
+    # wrap an array laid out as returned by AsArray, contiguous arrays are not
+    # copied, width and height are needed for compressed formats only
+    @classmethod
+    def FromArray(cls, array, internalformat, width=None, height=None):
+        array = np.ascontiguousarray(array)
+        if width is None:
+            width = array.shape[1]
+        if height is None:
+            height = array.shape[0]
+        return cls(width=width, height=height,
+            internalformat=internalformat,
+            dataSize=array.nbytes, data=array)
@@ -1,25 +1,52 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import networkx as nx
-import numpy as np
+import collections
+import fractions
+import multiprocessing
 import os
+import threading
 
 import OGLCommon
 from OGLCommon import OGLEnum, GetImageSize
-from UtilCommon import Which, RunCommand, Delete
+from UtilCommon import LazyModule, Delete
+from UtilExecutor import FindTool, RunTool, ScratchDirectory, DEFAULT_TIMEOUT, Job, IsCurrentJobCancelled
+from UtilProfile import RecordConversion, RecordRoute, MeasureStage
 from OGLImage import Image2D
 from OGLImageIO import SaveImage, LoadImage
+from OGLKTXFile import ReadKTXFile, KTXStreamWriter
+from OGLBlockPass import EncodeBlocks, ReencodeBlocks
+
+# heavy modules are only imported by the first converter using them
+np = LazyModule('numpy')
+OGLETCCodec = LazyModule('OGLETCCodec')
+OGLASTCCodec = LazyModule('OGLASTCCodec')
 
 ETCPACK_NAME = 'etcpack'
 ASTCENC_NAME = 'astcenc'
 
-# construct and register converter classes
-_converters = nx.DiGraph()
-
-def _RegisterImageConverter(src_format, dst_format, convert_func):
-
-    def _convert(input_image):
+# astcenc presets selected by the astc_effort option of ASTC encoding
+ASTC_EFFORT_LEVELS = ('fast', 'medium', 'thorough', 'exhaustive')
+ASTC_DEFAULT_EFFORT = 'thorough'
+
+# construct and register converter classes, the graph is kept as
+# {src_format : {dst_format : converter}} in registration order
+_converters = {}
+# memoized routes {(src_format, dst_format) : [format, ...] or None},
+# cleared whenever a converter is registered
+_routes = {}
+# array kernels of the edges between uncompressed formats
+# {(src_format, dst_format) : array_conversion}, used to fuse routes
+_array_conversions = {}
+# memoized conversion plans {(src_format, dst_format) : [converter, ...] or None}
+_plans = {}
+
+# convert_factory(src_format, dst_format, *factory_args) builds the convert
+# function, it only runs when the converter is used for the first time
+def _MakeConverter(src_format, dst_format, convert_factory, factory_args=()):
+    convert_funcs = []
+
+    def _convert(input_image, **options):
         # for empty image
         width = input_image.width
         height = input_image.height
@@ -34,170 +61,656 @@ def _RegisterImageConverter(src_format, dst_format, convert_func):
             OGLEnum.names[dst_format]))
         logger.debug('Input image : {0}'.format(str(input_image)))
 
-        output_image = convert_func(input_image)
+        with RecordConversion(src_format, dst_format, input_image.dataSize) as record:
+            if not convert_funcs:
+                convert_funcs.append(convert_factory(src_format, dst_format, *factory_args))
+            output_image = convert_funcs[0](input_image, **options)
+            record['bytes_out'] = 0 if output_image.IsEmpty() else output_image.dataSize
 
         logger.debug('Output image : {0}'.format(str(output_image)))
         return output_image
 
-    global _converters
-    _converters.add_nodes_from([src_format, dst_format])
-    _converters.add_edges_from([(src_format, dst_format,
-        {'converter' : _convert})])
-
-# Function factory between uncompressed formats
-def _RegisterBasicImageConverter(src_format, dst_format, pixel_conversion):
-    src_dtype = OGLCommon.GetGLTypeNumpyType(OGLCommon.GetGLType(src_format))
+    return _convert
+
+def _RegisterImageConverter(src_format, dst_format, convert_factory, factory_args=()):
+    if convert_factory is _BasicImageConverter:
+        _array_conversions[(src_format, dst_format)] = factory_args[0]
+    else:
+        _array_conversions.pop((src_format, dst_format), None)
+    # every encoder runs behind the block passes
+    if OGLCommon.IsCompressionFormat(dst_format) and not OGLCommon.IsCompressionFormat(src_format):
+        (convert_factory, factory_args) = (_BlockPassImageConverter, (convert_factory, factory_args))
+
+    _converters.setdefault(src_format, collections.OrderedDict())[dst_format] = \
+        _MakeConverter(src_format, dst_format, convert_factory, factory_args)
+    _converters.setdefault(dst_format, collections.OrderedDict())
+    _routes.clear()
+    _plans.clear()
+
+# breadth-first search for the route with the fewest conversions,
+# return the list of formats along it or None if there is none
+def _FindRoute(src_format, dst_format):
+    key = (src_format, dst_format)
+    if key in _routes:
+        return _routes[key]
+
+    previous = {src_format : None}
+    frontier = [src_format]
+    while frontier and dst_format not in previous:
+        next_frontier = []
+        for node in frontier:
+            for next_node in _converters.get(node, ()):
+                if next_node not in previous:
+                    previous[next_node] = node
+                    next_frontier.append(next_node)
+        frontier = next_frontier
+
+    route = None
+    if dst_format in previous:
+        route = [dst_format]
+        while previous[route[-1]] is not None:
+            route.append(previous[route[-1]])
+        route.reverse()
+    _routes[key] = route
+    return route
+
+# converters along the route, runs of two or more uncompressed edges are
+# replaced by one fused converter, return None if there is no route
+def _GetConversionPlan(src_format, dst_format):
+    key = (src_format, dst_format)
+    if key in _plans:
+        return _plans[key]
+
+    route = _FindRoute(src_format, dst_format)
+    plan = None
+    if route is not None:
+        plan = []
+        run = [route[0]]
+        for src_node, dest_node in zip(route[:-1], route[1:]):
+            if (src_node, dest_node) in _array_conversions:
+                run.append(dest_node)
+                continue
+            plan.extend(_PlanRun(run))
+            plan.append(_converters[src_node][dest_node])
+            run = [dest_node]
+        plan.extend(_PlanRun(run))
+    _plans[key] = plan
+    return plan
+
+def _PlanRun(run):
+    if len(run) == 2:
+        return [_converters[run[0]][run[1]]]
+    if len(run) > 2:
+        return [_MakeConverter(run[0], run[-1], _FusedImageConverter, (tuple(run),))]
+    return []
+
+# Function factory between uncompressed formats, array_conversion receives
+# the whole source buffer as a (pixel count, element count) array and returns
+# the destination array, so every kernel runs as one vectorized pass
+def _BasicImageConverter(src_format, dst_format, array_conversion):
     dst_dtype = OGLCommon.GetGLTypeNumpyType(OGLCommon.GetGLType(dst_format))
     element_count = OGLCommon.GetElementCount(src_format)
 
-    def _convert(input_image):
+    def _convert(input_image, **options):
         width = input_image.width
         height = input_image.height
-        src_array = np.fromstring(input_image.data, dtype=src_dtype).reshape((-1, element_count))
-        dst_data = np.array(map(pixel_conversion, src_array), dtype=dst_dtype).tostring()
+        src_array = input_image.AsArray().reshape((-1, element_count))
+        dst_data = np.ascontiguousarray(array_conversion(src_array), dtype=dst_dtype).tostring()
         return Image2D(width=width, height=height,
             internalformat=dst_format,
             dataSize=len(dst_data), data=dst_data)
 
-    _RegisterImageConverter(src_format, dst_format, _convert)
+    return _convert
 
-_RegisterBasicImageConverter(OGLEnum.GL_RGB8, OGLEnum.GL_RGBA8,
-    lambda pixel : (pixel[0], pixel[1], pixel[2], 255))
+# Function factory for a run of consecutive uncompressed edges along route,
+# the kernels are chained in memory with the same dtype cast after every hop
+# as the single edges, so the result is bit-exact with converting hop by hop.
+# Sources with one element of at most 16 bits (e.g. GL_RGB565) are converted
+# by one gather from a table of the chained result of every source value.
+def _FusedImageConverter(src_format, dst_format, route):
+    src_dtype = OGLCommon.GetGLTypeNumpyType(OGLCommon.GetGLType(src_format))
+    element_count = OGLCommon.GetElementCount(src_format)
+    hops = [(_array_conversions[(a, b)],
+        OGLCommon.GetGLTypeNumpyType(OGLCommon.GetGLType(b)),
+        OGLCommon.GetElementCount(b)) for a, b in zip(route[:-1], route[1:])]
+
+    def _Chain(src_array):
+        array = src_array
+        for array_conversion, dtype, count in hops:
+            array = np.ascontiguousarray(array_conversion(array), dtype=dtype).reshape((-1, count))
+        return array
+
+    table = []
+    if element_count == 1 and np.dtype(src_dtype).itemsize <= 2:
+        values = np.arange(1 << (8 * np.dtype(src_dtype).itemsize))
+        table.append(_Chain(values.astype(src_dtype).reshape((-1, 1))))
+
+    def _convert(input_image, **options):
+        width = input_image.width
+        height = input_image.height
+        src_array = input_image.AsArray().reshape((-1, element_count))
+        if table:
+            dst_array = table[0][src_array[:, 0]]
+        else:
+            dst_array = _Chain(src_array)
+        dst_data = dst_array.tostring()
+        return Image2D(width=width, height=height,
+            internalformat=dst_format,
+            dataSize=len(dst_data), data=dst_data)
 
-def RGB8_RGB565(pixel):
-    red, green, blue = pixel
-    red = red * (pow(2, 5) - 1) / 0xFF
-    green = green * (pow(2, 6) - 1) / 0xFF
-    blue = blue * (pow(2, 5) - 1) / 0xFF
+    return _convert
+
+# Function factory running the block passes of OGLBlockPass in front of the
+# encoder built by convert_factory, the solid_blocks=False option turns the
+# solid color pass off, dedup_blocks=False the repeated block pass
+def _BlockPassImageConverter(src_format, dst_format, convert_factory, factory_args):
+    encode = convert_factory(src_format, dst_format, *factory_args)
+
+    def _convert(input_image, **options):
+        return EncodeBlocks(input_image, dst_format,
+            lambda image : encode(image, **options),
+            solid_blocks=options.get('solid_blocks', True),
+            dedup_blocks=options.get('dedup_blocks', True))
+
+    return _convert
+
+def RGB8_RGBA8(pixels):
+    alpha = np.empty((pixels.shape[0], 1), dtype=pixels.dtype)
+    alpha.fill(0xFF)
+    return np.hstack((pixels, alpha))
+
+def RGB8_RGB565(pixels):
+    pixels = pixels.astype(np.uint32)
+    red = pixels[:, 0] * (pow(2, 5) - 1) // 0xFF
+    green = pixels[:, 1] * (pow(2, 6) - 1) // 0xFF
+    blue = pixels[:, 2] * (pow(2, 5) - 1) // 0xFF
     return red << 11 | green << 5 | blue
-_RegisterBasicImageConverter(OGLEnum.GL_RGB8, OGLEnum.GL_RGB565, RGB8_RGB565)
-
-def RGB565_RGB8(pixel):
-    red = ((pixel >> 11) & 0x1F) * 0xFF / 0x1F
-    green = ((pixel >> 5) & 0x3F) * 0xFF / 0x3F
-    blue = (pixel & 0x1F) * 0xFF / 0x1F
-    return (red, green, blue)
-_RegisterBasicImageConverter(OGLEnum.GL_RGB565, OGLEnum.GL_RGB8, RGB565_RGB8)
-
-def SRGB8_RGB8(pixel):
-    def _convert(sc):
-        sc /= 255.
-        if sc > 0.04045:
-            lc = pow((sc + 0.055) / 1.055, 2.4)
-        else:
-            lc = sc / 12.92
-        return int(lc * 255)
-    return map(_convert, pixel)
-_RegisterBasicImageConverter(OGLEnum.GL_SRGB8, OGLEnum.GL_RGB8, SRGB8_RGB8)
-
-def RGB8_SRGB8(pixel):
-    def _convert(lc):
-        lc /= 255.
-        if lc >= 0.0031308:
-            sc = pow(lc, 0.41666) * 1.055 - 0.055
-        else:
-            sc = lc * 12.92
-        return int(sc * 255)
-    return map(_convert, pixel)
-_RegisterBasicImageConverter(OGLEnum.GL_RGB8, OGLEnum.GL_SRGB8, RGB8_SRGB8)
 
-def _RegisterETCConverter(src_format, dst_format,
-    src_file_format, dst_file_format, extra_option=''):
+def RGB565_RGB8(pixels):
+    pixels = pixels[:, 0].astype(np.uint32)
+    red = ((pixels >> 11) & 0x1F) * 0xFF // 0x1F
+    green = ((pixels >> 5) & 0x3F) * 0xFF // 0x3F
+    blue = (pixels & 0x1F) * 0xFF // 0x1F
+    return np.column_stack((red, green, blue))
+
+# 256-entry transfer tables between sRGB and linear 8-bit values, built once
+# on first use so that the sRGB converters are a single indexed gather
+_srgb_tables = []
+
+def GetSRGBTables():
+    if not _srgb_tables:
+        values = np.arange(256) / 255.
+        to_linear = np.where(values > 0.04045,
+            np.power((values + 0.055) / 1.055, 2.4),
+            values / 12.92)
+        to_srgb = np.where(values >= 0.0031308,
+            np.power(values, 0.41666) * 1.055 - 0.055,
+            values * 12.92)
+        _srgb_tables.extend(((to_linear * 255).astype(np.uint8), (to_srgb * 255).astype(np.uint8)))
+    return _srgb_tables
+
+def SRGB8_RGB8(pixels):
+    return GetSRGBTables()[0][pixels]
+
+def RGB8_SRGB8(pixels):
+    return GetSRGBTables()[1][pixels]
+
+# alpha is stored linearly in GL_SRGB8_ALPHA8, only color channels go through the tables
+def SRGB8_ALPHA8_RGBA8(pixels):
+    return np.column_stack((GetSRGBTables()[0][pixels[:, :3]], pixels[:, 3]))
+
+def RGBA8_SRGB8_ALPHA8(pixels):
+    return np.column_stack((GetSRGBTables()[1][pixels[:, :3]], pixels[:, 3]))
+
+def _EncodeETCInProcess(input_image, dst_format, effort):
+    width = input_image.width
+    height = input_image.height
+    dst_data = OGLETCCodec.EncodeETC(input_image.AsArray(), dst_format, effort)
+    return Image2D(width=width, height=height,
+        internalformat=dst_format,
+        dataSize=len(dst_data), data=dst_data)
+
+def _ETCImageConverter(src_format, dst_format,
+    src_file_format, dst_file_format, extra_options=()):
 
     TEMP_PREFIX = 'temp'
-    src_filename = '.'.join((TEMP_PREFIX, src_file_format.lower()))
-    dst_filename = '.'.join((TEMP_PREFIX, dst_file_format.lower()))
-    tool_cmd = ' '.join((ETCPACK_NAME, src_filename, os.curdir, '-ktx', extra_option))
+    src_basename = '.'.join((TEMP_PREFIX, src_file_format.lower()))
+    dst_basename = '.'.join((TEMP_PREFIX, dst_file_format.lower()))
 
-    def _convert(input_image):
+    def _convert(input_image, **options):
         width = input_image.width
         height = input_image.height
         dataSize = GetImageSize(width, height, dst_format)
 
+        # an explicit etc_effort level selects the in-process encoder,
+        # etcpack is still used by default for release builds
+        effort = options.get('etc_effort')
+        if effort is not None:
+            if dst_format in OGLETCCodec.ETC_ENCODE_FORMATS:
+                return _EncodeETCInProcess(input_image, dst_format, effort)
+            logger.warning('In-process encoding of {0} is not supported, etc_effort ({1}) is ignored'.format(
+                OGLEnum.names[dst_format], effort))
+
         tool_filename = ETCPACK_NAME
-        if not Which(tool_filename):
+        if not FindTool(tool_filename):
             logger.error('Cannot find the specified tool ({0}) in the environment $PATH, return an empty image with dest format'.format(tool_filename))
             return Image2D(width=width, height=height,
                 internalformat=dst_format,
                 dataSize=dataSize)
 
-        SaveImage(src_filename, input_image)
-        RunCommand(tool_cmd)
-        output_image = LoadImage(dst_filename)
-
-        Delete(src_filename)
-        Delete(dst_filename)
-
-        return output_image
-
-    _RegisterImageConverter(src_format, dst_format, _convert)
-
-def _RegisterASTCConverter(src_format, dst_format,
+        # etcpack writes the output next to the input name in the given directory
+        with ScratchDirectory() as scratch_dir:
+            src_filename = os.path.join(scratch_dir, src_basename)
+            dst_filename = os.path.join(scratch_dir, dst_basename)
+            with MeasureStage('io'):
+                SaveImage(src_filename, input_image)
+            # output left by a failed, killed or cancelled run may be truncated
+            if not RunTool(tool_filename, [src_filename, scratch_dir, '-ktx'] + list(extra_options),
+                timeout=options.get('timeout', DEFAULT_TIMEOUT)):
+                return Image2D(width=width, height=height,
+                    internalformat=dst_format,
+                    dataSize=dataSize)
+            with MeasureStage('io'):
+                return LoadImage(dst_filename)
+
+    return _convert
+
+# ASTC encoding with astcenc, decoding runs in-process (_ASTCDecoder)
+def _ASTCImageConverter(src_format, dst_format,
     src_file_format, dst_file_format):
 
     TEMP_PREFIX = 'temp'
-    src_filename = '.'.join((TEMP_PREFIX, src_file_format.lower()))
-    dst_filename = '.'.join((TEMP_PREFIX, dst_file_format.lower()))
-    is_encode = OGLCommon.IsASTCCompressionFormat(dst_format)
-    if is_encode:
-        (bwidth, bheight) = OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION[dst_format]
+    src_basename = '.'.join((TEMP_PREFIX, src_file_format.lower()))
+    dst_basename = '.'.join((TEMP_PREFIX, dst_file_format.lower()))
+    (bwidth, bheight) = OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION[dst_format]
 
     # Note : During compression, if RGB channels are identical for all pixels, they will be combined into one channel
     # and after compression become alpha image instead of RGB
-    # TODO : convert A to RGB if the image from decompression contains alpha
-    tool_cmd = ' '.join((ASTCENC_NAME, '-cl' if is_encode else '-dl', src_filename, dst_filename,
-        '{0}x{1}'.format(bwidth, bheight) if is_encode else '', '-thorough'))
+    mode_option = '-cs' if OGLCommon.IsASTCSRGBFormat(dst_format) else '-cl'
+    block_options = ['{0}x{1}'.format(bwidth, bheight)]
 
-    def _convert(input_image):
+    def _convert(input_image, **options):
         width = input_image.width
         height = input_image.height
         dataSize = GetImageSize(width, height, dst_format)
 
         tool_filename = ASTCENC_NAME
-        if not Which(tool_filename):
+        if not FindTool(tool_filename):
             logger.error('Cannot find the specified tool ({0}) in the environment $PATH, return an empty image with dest format'.format(tool_filename))
             return Image2D(width=width, height=height,
                 internalformat=dst_format,
                 dataSize=dataSize)
 
-        SaveImage(src_filename, input_image)
-        RunCommand(tool_cmd)
-        output_image = LoadImage(dst_filename)
+        effort = options.get('astc_effort', ASTC_DEFAULT_EFFORT)
+        if effort not in ASTC_EFFORT_LEVELS:
+            logger.error('Unexpected ASTC effort ({0}), use {1}'.format(effort, ASTC_DEFAULT_EFFORT))
+            effort = ASTC_DEFAULT_EFFORT
+        encode_options = block_options + ['-' + effort]
+
+        with ScratchDirectory() as scratch_dir:
+            src_filename = os.path.join(scratch_dir, src_basename)
+            dst_filename = os.path.join(scratch_dir, dst_basename)
+            with MeasureStage('io'):
+                SaveImage(src_filename, input_image)
+            # output left by a failed, killed or cancelled run may be truncated
+            if not RunTool(tool_filename, [mode_option, src_filename, dst_filename] + encode_options,
+                timeout=options.get('timeout', DEFAULT_TIMEOUT)):
+                return Image2D(width=width, height=height,
+                    internalformat=dst_format,
+                    dataSize=dataSize)
+            with MeasureStage('io'):
+                output_image = LoadImage(dst_filename)
+
+        # .astc files are loaded with the linear format of their footprint
+        if not output_image.IsEmpty():
+            output_image.internalformat = dst_format
+        return output_image
 
-        #Delete(src_filename)
-        #Delete(dst_filename)
+    return _convert
 
-        return output_image
+# ETC decoding runs in-process, no need for etcpack
+def _ETCDecoder(src_format, dst_format):
 
-    _RegisterImageConverter(src_format, dst_format, _convert)
-
-_RegisterETCConverter(OGLEnum.GL_RGB8, OGLEnum.GL_ETC1_RGB8_OES,
-    'PPM', 'KTX', '-c etc1')
-_RegisterETCConverter(OGLEnum.GL_ETC1_RGB8_OES, OGLEnum.GL_RGB8,
-    'KTX', 'PPM', '-c etc1')
-_RegisterETCConverter(OGLEnum.GL_RGB8, OGLEnum.GL_COMPRESSED_RGB8_ETC2,
-    'PPM', 'KTX')
-_RegisterETCConverter(OGLEnum.GL_COMPRESSED_RGB8_ETC2, OGLEnum.GL_RGB8,
-    'KTX', 'PPM')
-_RegisterETCConverter(OGLEnum.GL_RGBA8, OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2,
-    'TGA', 'KTX', '-f RGBA1')
-_RegisterETCConverter(OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2, OGLEnum.GL_RGBA8,
-    'KTX', 'TGA', '-ext TGA')
-_RegisterETCConverter(OGLEnum.GL_RGBA8, OGLEnum.GL_COMPRESSED_RGBA8_ETC2_EAC,
-    'TGA', 'KTX', '-f RGBA8')
-_RegisterETCConverter(OGLEnum.GL_COMPRESSED_RGBA8_ETC2_EAC, OGLEnum.GL_RGBA8,
-    'KTX', 'TGA', '-ext TGA')
-
-_RegisterASTCConverter(OGLEnum.GL_RGBA8, OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR, 'KTX', 'ASTC')
-_RegisterASTCConverter(OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR, OGLEnum.GL_RGBA8, 'ASTC', 'KTX')
-
-def Convert(input_image, dest_format):
-    try:
-        path = nx.shortest_path(_converters, input_image.internalformat, dest_format)
-        for src_node, dest_node in zip(path[:-1], path[1:]):
-            con = _converters[src_node][dest_node]['converter']
-            input_image = con(input_image)
-        return input_image
-    except nx.NetworkXNoPath:
+    def _convert(input_image, **options):
+        width = input_image.width
+        height = input_image.height
+        dst_data = OGLETCCodec.DecodeETC(input_image.AsArray(),
+            width, height, src_format).tostring()
+        return Image2D(width=width, height=height,
+            internalformat=dst_format,
+            dataSize=len(dst_data), data=dst_data)
+
+    return _convert
+
+# etcpack has no sRGB mode, this edge is always encoded in-process
+def _ETCEncoder(src_format, dst_format):
+
+    def _convert(input_image, **options):
+        effort = options.get('etc_effort') or OGLETCCodec.ETC_EFFORT_LEVELS[0]
+        return _EncodeETCInProcess(input_image, dst_format, effort)
+
+    return _convert
+
+# ASTC decoding runs in-process for every block footprint, no need for astcenc
+def _ASTCDecoder(src_format, dst_format):
+
+    def _convert(input_image, **options):
+        width = input_image.width
+        height = input_image.height
+        dst_data = OGLASTCCodec.DecodeASTC(input_image.AsArray(),
+            width, height, src_format).tostring()
+        return Image2D(width=width, height=height,
+            internalformat=dst_format,
+            dataSize=len(dst_data), data=dst_data)
+
+    return _convert
+
+# Declarative table of every conversion edge as
+# (src_format, dst_format, convert factory, factory arguments)
+CONVERTER_TABLE = [
+    (OGLEnum.GL_RGB8, OGLEnum.GL_RGBA8, _BasicImageConverter, (RGB8_RGBA8,)),
+    (OGLEnum.GL_RGB8, OGLEnum.GL_RGB565, _BasicImageConverter, (RGB8_RGB565,)),
+    (OGLEnum.GL_RGB565, OGLEnum.GL_RGB8, _BasicImageConverter, (RGB565_RGB8,)),
+    (OGLEnum.GL_SRGB8, OGLEnum.GL_RGB8, _BasicImageConverter, (SRGB8_RGB8,)),
+    (OGLEnum.GL_RGB8, OGLEnum.GL_SRGB8, _BasicImageConverter, (RGB8_SRGB8,)),
+    (OGLEnum.GL_SRGB8_ALPHA8, OGLEnum.GL_RGBA8, _BasicImageConverter, (SRGB8_ALPHA8_RGBA8,)),
+    (OGLEnum.GL_RGBA8, OGLEnum.GL_SRGB8_ALPHA8, _BasicImageConverter, (RGBA8_SRGB8_ALPHA8,)),
+
+    (OGLEnum.GL_RGB8, OGLEnum.GL_ETC1_RGB8_OES, _ETCImageConverter,
+        ('PPM', 'KTX', ('-c', 'etc1'))),
+    (OGLEnum.GL_RGB8, OGLEnum.GL_COMPRESSED_RGB8_ETC2, _ETCImageConverter,
+        ('PPM', 'KTX')),
+    (OGLEnum.GL_RGBA8, OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2, _ETCImageConverter,
+        ('TGA', 'KTX', ('-f', 'RGBA1'))),
+    (OGLEnum.GL_RGBA8, OGLEnum.GL_COMPRESSED_RGBA8_ETC2_EAC, _ETCImageConverter,
+        ('TGA', 'KTX', ('-f', 'RGBA8'))),
+    (OGLEnum.GL_SRGB8, OGLEnum.GL_COMPRESSED_SRGB8_ETC2, _ETCEncoder, ()),
+] + [
+    (etc_format, OGLCommon.ETC_DECODE_FORMAT[etc_format], _ETCDecoder, ())
+    for etc_format in OGLCommon.ETC_64BIT_FORMATS + OGLCommon.ETC_128BIT_FORMATS
+] + [
+    (OGLCommon.GetASTCDecodeFormat(astc_format), astc_format, _ASTCImageConverter, ('KTX', 'ASTC'))
+    for astc_format in sorted(OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION)
+] + [
+    (astc_format, OGLCommon.GetASTCDecodeFormat(astc_format), _ASTCDecoder, ())
+    for astc_format in sorted(OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION)
+]
+
+for (src_format, dst_format, convert_factory, factory_args) in CONVERTER_TABLE:
+    _RegisterImageConverter(src_format, dst_format, convert_factory, factory_args)
+
+# Split an uncompressed image into tiles aligned to the block footprint of
+# dest_format, return the block coordinates of every tile and the tiles
+def SplitTiles(input_image, dest_format, tile_size):
+    width = input_image.width
+    height = input_image.height
+    (bwidth, bheight) = OGLCommon.GetBlockDimension(dest_format)
+    if isinstance(tile_size, int):
+        tile_size = (tile_size, tile_size)
+    tile_width = max(1, tile_size[0] // bwidth) * bwidth
+    tile_height = max(1, tile_size[1] // bheight) * bheight
+
+    pixels = input_image.AsArray()
+    origins = []
+    tiles = []
+    for y in range(0, height, tile_height):
+        for x in range(0, width, tile_width):
+            tile = pixels[y:y + tile_height, x:x + tile_width]
+            tile_data = tile.tostring()
+            origins.append((x // bwidth, y // bheight))
+            tiles.append(Image2D(width=tile.shape[1], height=tile.shape[0],
+                internalformat=input_image.internalformat,
+                dataSize=len(tile_data), data=tile_data))
+    return origins, tiles
+
+# Copy the block rows of converted tiles back into one image of dest_format,
+# blocks are independent so the result matches converting the whole image
+def StitchTiles(width, height, dest_format, origins, tiles, output_images):
+    (bwidth, bheight) = OGLCommon.GetBlockDimension(dest_format)
+    block_size = OGLCommon.GetBlockSize(dest_format)
+    blocks = np.zeros(((height + bheight - 1) // bheight,
+        (width + bwidth - 1) // bwidth, block_size), dtype=np.uint8)
+    for (bx, by), tile, output_image in zip(origins, tiles, output_images):
+        if output_image.IsEmpty() or output_image.internalformat != dest_format:
+            logger.error('Failed to convert the tile at ({0}, {1}), return an empty image'.format(
+                bx * bwidth, by * bheight))
+            return Image2D()
+        tile_blocks = output_image.AsArray()
+        blocks[by:by + tile_blocks.shape[0], bx:bx + tile_blocks.shape[1]] = tile_blocks
+
+    dst_data = blocks.tostring()
+    return Image2D(width=width, height=height,
+        internalformat=dest_format,
+        dataSize=len(dst_data), data=dst_data)
+
+# convert the tiles on a process pool, the whole image is cached by the caller
+def _ConvertTiled(input_image, dest_format, tile_size, workers, **options):
+    (origins, tiles) = SplitTiles(input_image, dest_format, tile_size)
+    output_images = ConvertMany(tiles, dest_format, workers=workers, cache=None, **options)
+    return StitchTiles(input_image.width, input_image.height, dest_format,
+        origins, tiles, output_images)
+
+# Conversion cache used when Convert is not given a cache option, None disables caching
+_conversion_cache = None
+
+def SetConversionCache(cache):
+    global _conversion_cache
+    _conversion_cache = cache
+
+def GetConversionCache():
+    return _conversion_cache
+
+# options are passed to every converter along the path, e.g.
+# etc_effort='fast' or 'quality' (ETC_EFFORT_LEVELS) selects the in-process
+# ETC1/ETC2 RGB encoder instead of etcpack, astc_effort='fast' to 'exhaustive'
+# (ASTC_EFFORT_LEVELS) the astcenc preset. The two levels are separate options,
+# the encoders have different presets and a chain through both formats can
+# set each of them,
+# tile_size=N (or (w, h)) compresses tiles in parallel on workers processes,
+# previous=(previous_image, previous_output) only re-encodes the blocks that
+# differ from previous_image, previous_output being previous_image converted
+# to dest_format with the same options,
+# cache=ConversionCache(...) (or None) overrides the global conversion cache
+def Convert(input_image, dest_format, **options):
+    cache = options.pop('cache', _conversion_cache)
+    if cache is None or input_image.IsEmpty():
+        return _ConvertUncached(input_image, dest_format, **options)
+
+    key = cache.Key(input_image, dest_format, options)
+    output_image = cache.Get(key)
+    if output_image is None:
+        output_image = _ConvertUncached(input_image, dest_format, **options)
+        if not output_image.IsEmpty():
+            cache.Put(key, output_image)
+    return output_image
+
+def _ConvertUncached(input_image, dest_format, **options):
+    previous = options.pop('previous', None)
+    if previous and not input_image.IsEmpty() and \
+       OGLCommon.IsCompressionFormat(dest_format) and \
+       not OGLCommon.IsCompressionFormat(input_image.internalformat):
+        (previous_image, previous_output) = previous
+        return ReencodeBlocks(input_image, previous_image, previous_output, dest_format,
+            lambda image : _ConvertUncached(image, dest_format, **options))
+
+    tile_size = options.pop('tile_size', None)
+    workers = options.pop('workers', None)
+    if tile_size and not input_image.IsEmpty() and \
+       OGLCommon.IsCompressionFormat(dest_format) and \
+       not OGLCommon.IsCompressionFormat(input_image.internalformat):
+        return _ConvertTiled(input_image, dest_format, tile_size, workers, **options)
+
+    plan = _GetConversionPlan(input_image.internalformat, dest_format)
+    if plan is None:
         logger.error('Cannot find conversions from {0} to {1}'.format(OGLEnum.names[input_image.internalformat], OGLEnum.names[dest_format]))
         return Image2D()
+
+    with RecordRoute(_FindRoute(input_image.internalformat, dest_format)):
+        for con in plan:
+            if IsCurrentJobCancelled():
+                return Image2D()
+            input_image = con(input_image, **options)
+    return input_image
+
+# conversions of ConvertAsync running at the same time
+MAX_CONCURRENT_CONVERSIONS = multiprocessing.cpu_count()
+
+_conversion_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CONVERSIONS)
+
+def SetMaxConcurrentConversions(count):
+    global MAX_CONCURRENT_CONVERSIONS, _conversion_slots
+    MAX_CONCURRENT_CONVERSIONS = max(1, count)
+    _conversion_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CONVERSIONS)
+
+# Pending result of ConvertAsync. Done callbacks run in the converting thread
+# (or at once when added to a done future), event loops should hand the
+# result over to their own thread from there. A cancelled conversion stops
+# before its next converter, kills its running external tools and gives an
+# empty image.
+class ConversionFuture(object):
+
+    def __init__(self):
+        self._job = Job()
+        self._done = threading.Event()
+        self._result = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def Cancel(self):
+        self._job.Cancel()
+
+    def IsCancelled(self):
+        return self._job.cancelled
+
+    def IsDone(self):
+        return self._done.is_set()
+
+    # output image, or None if the conversion is not done within timeout seconds
+    def Result(self, timeout=None):
+        self._done.wait(timeout)
+        return self._result
+
+    def AddDoneCallback(self, callback):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _Run(self, input_image, dest_format, options):
+        output_image = Image2D()
+        try:
+            with _conversion_slots:
+                if not self._job.cancelled:
+                    with self._job.Running():
+                        output_image = Convert(input_image, dest_format, **options)
+        except Exception:
+            logger.exception('Failed to convert to {0}'.format(OGLEnum.names[dest_format]))
+        if self._job.cancelled:
+            output_image = Image2D()
+
+        with self._lock:
+            self._result = output_image
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception('Conversion done callback failed : {0}'.format(callback))
+
+# Start Convert on a background thread and return a ConversionFuture at once,
+# external tools and in-process kernels never block the caller. At most
+# MAX_CONCURRENT_CONVERSIONS conversions run at a time, the others wait.
+def ConvertAsync(input_image, dest_format, callback=None, **options):
+    future = ConversionFuture()
+    if callback:
+        future.AddDoneCallback(callback)
+    thread = threading.Thread(target=future._Run, args=(input_image, dest_format, options))
+    thread.daemon = True
+    thread.start()
+    return future
+
+# Images of the batch of this pool worker, set by the pool initializer so that
+# every pool captures its own batch. With fork the initializer arguments are
+# inherited, workers share the buffers and only receive indices.
+_batch_images = None
+
+def _InitBatchWorker(images):
+    global _batch_images
+    _batch_images = images
+
+def _ConvertBatchItem(args):
+    image, dest_format, options, index = args
+    if image is None:
+        image = _batch_images[index]
+    return Convert(image, dest_format, **options)
+
+# Convert a sequence of images on a process pool, output images are yielded
+# in input order as soon as each one (and all before it) is finished. Pool
+# workers are daemon processes that cannot have children, batches started
+# inside one (e.g. tiled conversions of a batch) run serially in the worker.
+# workers (the pool size) applies to the whole batch, options are passed to
+# Convert for every image, except tile_size which is ignored since the images
+# already run in parallel (CompressMipmaps tiles the images of a batch).
+def ConvertMany(images, dest_format, workers=None, **options):
+    images = list(images)
+    if options.pop('tile_size', None):
+        logger.warning('ConvertMany ignores tile_size, images of a batch are converted in parallel')
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(images))
+    if multiprocessing.current_process().daemon:
+        workers = 1
+    if workers <= 1:
+        for image in images:
+            yield Convert(image, dest_format, **options)
+        return
+
+    # without fork (e.g. Windows) the images have to travel with the tasks
+    inherit = hasattr(os, 'fork')
+    tasks = ((None if inherit else image, dest_format, options, index)
+        for index, image in enumerate(images))
+    pool = multiprocessing.Pool(workers, initializer=_InitBatchWorker,
+        initargs=(images if inherit else None, ))
+    try:
+        for output_image in pool.imap(_ConvertBatchItem, tasks):
+            yield output_image
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+# Convert the base image of a KTX file into a new KTX file strip by strip, only
+# strip_height rows (rounded to the block heights of both formats) are held in
+# memory at once, return True on success
+def ConvertKTXFile(src_filepath, dst_filepath, dest_format, strip_height=256, **options):
+    src_file = ReadKTXFile(src_filepath)
+    if src_file is None:
+        return False
+    if src_file.GetLevelCount() > 1 or src_file.GetLayerCount() > 1 or src_file.numberOfFaces > 1:
+        logger.warning('Only the base image of {0} is converted'.format(src_filepath))
+
+    width = src_file.width
+    height = src_file.height
+    src_bheight = OGLCommon.GetBlockDimension(src_file.internalformat)[1]
+    dst_bheight = OGLCommon.GetBlockDimension(dest_format)[1]
+    alignment = src_bheight * dst_bheight // fractions.gcd(src_bheight, dst_bheight)
+    strip_height = max(1, strip_height // alignment) * alignment
+    options.pop('cache', None)
+
+    with KTXStreamWriter(dst_filepath, width, height, dest_format) as writer:
+        for y in range(0, height, strip_height):
+            strip = src_file.ReadRows(y, strip_height)
+            output_image = Convert(strip, dest_format, cache=None, **options)
+            if output_image.IsEmpty() or output_image.internalformat != dest_format:
+                logger.error('Failed to convert rows {0} to {1} of {2}'.format(
+                    y, y + strip.height, src_filepath))
+                break
+            writer.WriteRows(output_image)
+        else:
+            return True
+
+    Delete(dst_filepath)
+    return False
@@ -1,16 +1,20 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import Image, os, struct
+import mmap, os, struct
 
 import OGLCommon
-from OGLCommon import OGLEnum, GetGLType, GetGLFormat, GetGLTypeSize
+from OGLCommon import OGLEnum
 from OGLImage import Image2D
+from UtilCommon import LazyModule
+from OGLKTXFile import ReadKTXFile, WriteKTXFile
+
+# PIL is only needed for formats other than KTX and ASTC
+Image = LazyModule('Image')
 
 ASTC_HEAD_MAGIC = 0x5CA1AB13
 ASTC_HEADER_STRUCT = struct.Struct('I' + 'B' * 12)
 
-KTX_HEADER_STRUCT = struct.Struct('I' * 14)
 
 def SaveImage(filepath, image):
 
@@ -39,12 +43,14 @@ def SaveImage(filepath, image):
             Image.fromstring(
                 format_dict[image.internalformat],
                 (image.width, image.height),
-                image.data).save(filepath)
+                image.ToBytes()).save(filepath)
         except IOError:
             logger.error('Failed to save image as {0}'.format(filepath))
             return
 
-def LoadImage(filepath):
+# with use_mmap, KTX and ASTC payloads are read-only buffers into the mapped
+# file and are only copied when a converter produces new data
+def LoadImage(filepath, use_mmap=False):
 
     if not os.path.exists(filepath):
         logger.error('Cannot find the specified file ({0}), return an empty image'.format(filepath))
@@ -54,9 +60,9 @@ def LoadImage(filepath):
 
     ext = os.path.splitext(filepath)[-1]
     if ext == '.ktx':
-        return LoadKTXImage(filepath)
+        return LoadKTXImage(filepath, use_mmap)
     elif ext == '.astc':
-        return LoadASTCImage(filepath)
+        return LoadASTCImage(filepath, use_mmap)
     else:
         try:
             im = Image.open(filepath)
@@ -73,27 +79,16 @@ def LoadImage(filepath):
             logger.error('Failed to load image from {0}, return an empty image'.format(filepath))
             return Image2D()
 
-def SaveKTXImage(filepath, image):
+# read size bytes at the current file position, or map the file and return a
+# zero-copy read-only buffer over them
+def _ReadPayload(f, size, use_mmap):
+    if not use_mmap or not size:
+        return f.read(size)
+    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return buffer(mapping, f.tell(), size)
 
-    with open(filepath, 'w') as f:
-        identifier = '\xabKTX 11\xbb\r\n\x1a\n'
-        f.write(identifier)
-
-        endianness = 0x04030201
-        width = image.width
-        height = image.height
-        internalformat = image.internalformat
-        glType = GetGLType(internalformat)
-        glTypeSize = GetGLTypeSize(glType)
-        glFormat = GetGLFormat(internalformat)
-        header_data = (endianness, glType, glTypeSize, glFormat,
-            internalformat, glFormat, width, height, 0,
-            0, 1, 1, 0, image.dataSize)
-        header = KTX_HEADER_STRUCT.pack(*header_data)
-        f.write(header)
-
-        if image.dataSize:
-            f.write(image.data)
+def SaveKTXImage(filepath, image):
+    WriteKTXFile(filepath, [[image]])
 
 def SaveASTCImage(filepath, image):
 
@@ -119,38 +114,13 @@ def SaveASTCImage(filepath, image):
 
         f.write(image.data)
 
-def LoadKTXImage(filepath):
-
-    if not os.path.exists(filepath):
-        logger.error('Cannot find the specified file ({0}), return an empty image'.format(filepath))
+def LoadKTXImage(filepath, use_mmap=False):
+    ktx_file = ReadKTXFile(filepath, use_mmap)
+    if ktx_file is None:
         return Image2D()
+    return ktx_file.GetImage()
 
-    with open(filepath) as f:
-        identifier = '\xabKTX 11\xbb\r\n\x1a\n'
-        data = f.read(len(identifier))
-        if data != identifier:
-            logger.error('Invalid KTX file')
-            return Image2D()
-
-        _, glType, _, glFormat, internalformat, glBaseInternalFormat, \
-        width, height, depth, _, _, _, _, dataSize = \
-            KTX_HEADER_STRUCT.unpack(f.read(KTX_HEADER_STRUCT.size))
-        # if internalformat is not a sized one, try to fix it
-        if internalformat in (OGLEnum.GL_RGB, OGLEnum.GL_RGBA):
-            internalformat = OGLCommon.GetSizedInternalFormat(glFormat, glType)
-
-        logger.debug('KTX file info : dimension ({0}x{1}) internalformat ({2}) glType({3}) glFormat({4}) dataSize ({5})'.format(width, height,
-        OGLEnum.names[internalformat],
-        OGLEnum.names[glType],
-        OGLEnum.names[glFormat],
-        dataSize))
-        data = f.read(dataSize)
-
-        return Image2D(width=width, height=height,
-            internalformat=internalformat,
-            dataSize=dataSize, data=data)
-
-def LoadASTCImage(filepath):
+def LoadASTCImage(filepath, use_mmap=False):
 
     if not os.path.exists(filepath):
         logger.error('Cannot find the specified file ({0}), return an empty image'.format(filepath))
@@ -164,10 +134,10 @@ def LoadASTCImage(filepath):
                 ASTC_HEADER_STRUCT.unpack(f.read(ASTC_HEADER_STRUCT.size))
 
         internalformat = OGLCommon.ASTC_FORMAT_FROM_BLOCK_DIMENSION[(blockDimX, blockDimY)]
-        width = xsize0 + xsize1 * 0xFF + xsize2 * 0xFFFF
-        height = ysize0 + ysize1 * 0xFF + ysize2 * 0xFFFF
+        width = xsize0 | xsize1 << 8 | xsize2 << 16
+        height = ysize0 | ysize1 << 8 | ysize2 << 16
         dataSize = OGLCommon.GetImageSize(width, height, internalformat)
-        data = f.read(dataSize)
+        data = _ReadPayload(f, dataSize, use_mmap)
         return Image2D(width=width, height=height,
             internalformat=internalformat,
             dataSize=dataSize, data=data)
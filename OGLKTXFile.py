@@ -0,0 +1,289 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import array, collections, mmap, os, struct
+
+import OGLCommon
+from OGLCommon import OGLEnum, GetGLType, GetGLFormat, GetGLTypeSize
+from OGLImage import Image2D
+
+# KTX 1.1 container : mipmap chains, array layers, cube faces and key/value data.
+# Reading only parses the header and builds an index of where every image lives,
+# image payloads are read (or mapped) when they are asked for.
+
+KTX_IDENTIFIER = '\xabKTX 11\xbb\r\n\x1a\n'
+KTX_ENDIANNESS = 0x04030201
+KTX_HEADER_FIELDS = 13
+KTX_HEADER_SIZE = len(KTX_IDENTIFIER) + KTX_HEADER_FIELDS * 4
+CUBE_FACE_COUNT = 6
+
+def _Padding(size):
+    return 3 - ((size + 3) % 4)
+
+def _GetBaseInternalFormat(internalformat):
+    if OGLCommon.IsCompressionFormat(internalformat):
+        if internalformat in (OGLEnum.GL_ETC1_RGB8_OES,
+            OGLEnum.GL_COMPRESSED_RGB8_ETC2, OGLEnum.GL_COMPRESSED_SRGB8_ETC2):
+            return OGLEnum.GL_RGB
+        return OGLEnum.GL_RGBA
+    return GetGLFormat(internalformat)
+
+# bytes of one row of an uncompressed image as stored in KTX,
+# rows are aligned to 4 bytes (GL_UNPACK_ALIGNMENT)
+def _GetRowSizes(width, internalformat):
+    if OGLCommon.IsCompressionFormat(internalformat):
+        return None
+    row_size = width * OGLCommon.GetPixelSize(internalformat)
+    return row_size, row_size + _Padding(row_size)
+
+def _PadRows(data, width, height, internalformat):
+    row_sizes = _GetRowSizes(width, internalformat)
+    if not row_sizes or row_sizes[0] == row_sizes[1]:
+        return data
+    (row_size, padded_row_size) = row_sizes
+    padding = '\0' * (padded_row_size - row_size)
+    return ''.join(data[y * row_size:(y + 1) * row_size] + padding for y in range(height))
+
+# files written without row alignment are accepted as well
+def _HasRowPadding(size, width, height, internalformat):
+    row_sizes = _GetRowSizes(width, internalformat)
+    return bool(row_sizes) and row_sizes[0] != row_sizes[1] and size == row_sizes[1] * height
+
+def _UnpadRows(data, width, height, internalformat):
+    if not _HasRowPadding(len(data), width, height, internalformat):
+        return data
+    (row_size, padded_row_size) = _GetRowSizes(width, internalformat)
+    return ''.join(data[y * padded_row_size:y * padded_row_size + row_size] for y in range(height))
+
+class KTXFile(object):
+
+    def __init__(self, filepath, header, key_value_data, index, swap_bytes, use_mmap):
+        self.filepath = filepath
+        (_, self.glType, self.glTypeSize, self.glFormat, self.internalformat,
+            self.glBaseInternalFormat, self.width, self.height, self.depth,
+            self.numberOfArrayElements, self.numberOfFaces,
+            self.numberOfMipmapLevels, _) = header
+        # {key : value}, values are raw bytes as stored in the file
+        self.key_value_data = key_value_data
+        # {(level, layer, face) : (offset, size)}
+        self.index = index
+        self.swap_bytes = swap_bytes
+        self.use_mmap = use_mmap
+        self._mapping = None
+
+    def __repr__(self):
+        return 'KTXFile : dimension({0}x{1}), internalformat({2}), levels({3}), layers({4}), faces({5})' \
+            .format(self.width, self.height, OGLEnum.names[self.internalformat],
+                self.GetLevelCount(), self.GetLayerCount(), self.numberOfFaces)
+
+    def GetLevelCount(self):
+        return max(1, self.numberOfMipmapLevels)
+
+    def GetLayerCount(self):
+        return max(1, self.numberOfArrayElements)
+
+    def GetLevelDimension(self, level):
+        return max(1, self.width >> level), max(1, self.height >> level)
+
+    def GetImage(self, level=0, layer=0, face=0):
+        if (level, layer, face) not in self.index:
+            logger.error('KTX file {0} has no image at level({1}) layer({2}) face({3}), return an empty image'.format(
+                self.filepath, level, layer, face))
+            return Image2D()
+
+        (offset, size) = self.index[(level, layer, face)]
+        (width, height) = self.GetLevelDimension(level)
+        if self.use_mmap and not self.swap_bytes and size and \
+           not _HasRowPadding(size, width, height, self.internalformat):
+            if self._mapping is None:
+                with open(self.filepath, 'rb') as f:
+                    self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            data = buffer(self._mapping, offset, size)
+        else:
+            data = self._ReadData(offset, size, width, height)
+
+        return Image2D(width=width, height=height,
+            internalformat=self.internalformat,
+            dataSize=len(data), data=data)
+
+    # Rows [y, y + row_count) of one image, for compressed formats y must be
+    # aligned to the block height and whole block rows are read
+    def ReadRows(self, y, row_count, level=0, layer=0, face=0):
+        if (level, layer, face) not in self.index:
+            logger.error('KTX file {0} has no image at level({1}) layer({2}) face({3}), return an empty image'.format(
+                self.filepath, level, layer, face))
+            return Image2D()
+
+        (offset, size) = self.index[(level, layer, face)]
+        (width, height) = self.GetLevelDimension(level)
+        (bwidth, bheight) = OGLCommon.GetBlockDimension(self.internalformat)
+        row_count = max(0, min(row_count, height - y))
+        # stored bytes per row of blocks, including any row alignment
+        block_row_size = size // ((height + bheight - 1) // bheight)
+        data = self._ReadData(offset + (y // bheight) * block_row_size,
+            ((row_count + bheight - 1) // bheight) * block_row_size, width, row_count)
+        return Image2D(width=width, height=row_count,
+            internalformat=self.internalformat,
+            dataSize=len(data), data=data)
+
+    def _ReadData(self, offset, size, width, height):
+        with open(self.filepath, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size)
+        if self.swap_bytes and self.glTypeSize in (2, 4):
+            words = array.array('H' if self.glTypeSize == 2 else 'I', data)
+            words.byteswap()
+            data = words.tostring()
+        return _UnpadRows(data, width, height, self.internalformat)
+
+    # images[level][layer * faces + face]
+    def GetImages(self):
+        return [[self.GetImage(level, layer, face)
+            for layer in range(self.GetLayerCount())
+            for face in range(self.numberOfFaces)]
+            for level in range(self.GetLevelCount())]
+
+def ReadKTXFile(filepath, use_mmap=False):
+
+    if not os.path.exists(filepath):
+        logger.error('Cannot find the specified file ({0})'.format(filepath))
+        return None
+
+    with open(filepath, 'rb') as f:
+        if f.read(len(KTX_IDENTIFIER)) != KTX_IDENTIFIER:
+            logger.error('Invalid KTX file')
+            return None
+
+        header_data = f.read(KTX_HEADER_FIELDS * 4)
+        endian = '<' if struct.unpack('<I', header_data[:4])[0] == KTX_ENDIANNESS else '>'
+        header = list(struct.unpack(endian + 'I' * KTX_HEADER_FIELDS, header_data))
+        (_, glType, _, glFormat, internalformat, _, width, height, depth,
+            numberOfArrayElements, numberOfFaces, numberOfMipmapLevels,
+            bytesOfKeyValueData) = header
+
+        # if internalformat is not a sized one, try to fix it
+        if internalformat in (OGLEnum.GL_RGB, OGLEnum.GL_RGBA):
+            internalformat = OGLCommon.GetSizedInternalFormat(glFormat, glType)
+            header[4] = internalformat
+        if depth > 1:
+            logger.error('3D KTX textures are not supported ({0})'.format(filepath))
+            return None
+        header[7] = height = max(1, height)
+        header[10] = numberOfFaces = max(1, numberOfFaces)
+
+        key_value_data = collections.OrderedDict()
+        key_value_end = KTX_HEADER_SIZE + bytesOfKeyValueData
+        while f.tell() < key_value_end:
+            (key_value_size, ) = struct.unpack(endian + 'I', f.read(4))
+            key_value = f.read(key_value_size)
+            f.read(_Padding(key_value_size))
+            (key, _, value) = key_value.partition('\0')
+            key_value_data[key] = value
+
+        index = {}
+        offset = key_value_end
+        layer_count = max(1, numberOfArrayElements)
+        cube_padding = numberOfArrayElements == 0 and numberOfFaces == CUBE_FACE_COUNT
+        for level in range(max(1, numberOfMipmapLevels)):
+            f.seek(offset)
+            size_data = f.read(4)
+            if len(size_data) < 4:
+                logger.error('Truncated KTX file {0} at level {1}'.format(filepath, level))
+                break
+            (imageSize, ) = struct.unpack(endian + 'I', size_data)
+            offset += 4
+            face_size = imageSize if cube_padding else imageSize // (layer_count * numberOfFaces)
+            for layer in range(layer_count):
+                for face in range(numberOfFaces):
+                    index[(level, layer, face)] = (offset, face_size)
+                    offset += face_size
+                    if cube_padding:
+                        offset += _Padding(face_size)
+            offset += _Padding(offset)
+
+    logger.debug('KTX file info : dimension ({0}x{1}) internalformat ({2}) levels ({3}) layers ({4}) faces ({5})'.format(
+        width, height, OGLEnum.names[internalformat],
+        numberOfMipmapLevels, numberOfArrayElements, numberOfFaces))
+    return KTXFile(filepath, header, key_value_data, index, endian == '>', use_mmap)
+
+def _WriteHeader(f, width, height, internalformat,
+    array_elements, faces, level_count, key_value_bytes):
+    glType = GetGLType(internalformat)
+    glTypeSize = GetGLTypeSize(glType)
+    glFormat = GetGLFormat(internalformat)
+    f.write(KTX_IDENTIFIER)
+    f.write(struct.pack('<' + 'I' * KTX_HEADER_FIELDS,
+        KTX_ENDIANNESS, glType, glTypeSize, glFormat,
+        internalformat, _GetBaseInternalFormat(internalformat),
+        width, height, 0,
+        array_elements, faces, level_count, len(key_value_bytes)))
+    f.write(key_value_bytes)
+
+# levels[level][layer * faces + face] are Image2D of one internalformat,
+# array_elements is 0 for non-array textures and faces is 1 or 6
+def WriteKTXFile(filepath, levels, array_elements=0, faces=1, key_value_data=None):
+    base_image = levels[0][0]
+    internalformat = base_image.internalformat
+    layer_count = max(1, array_elements)
+    if any(len(images) != layer_count * faces for images in levels):
+        logger.error('Every mipmap level needs {0} images to write {1}'.format(layer_count * faces, filepath))
+        return
+
+    key_values = []
+    for key, value in (key_value_data or {}).items():
+        key_value = key + '\0' + value
+        key_values.append(struct.pack('<I', len(key_value)) + key_value + '\0' * _Padding(len(key_value)))
+    key_value_bytes = ''.join(key_values)
+
+    with open(filepath, 'wb') as f:
+        _WriteHeader(f, base_image.width, base_image.height, internalformat,
+            array_elements, faces, len(levels), key_value_bytes)
+
+        cube_padding = array_elements == 0 and faces == CUBE_FACE_COUNT
+        for images in levels:
+            face_data = [_PadRows(image.ToBytes(), image.width, image.height, internalformat)
+                for image in images]
+            if cube_padding:
+                f.write(struct.pack('<I', len(face_data[0])))
+                for data in face_data:
+                    f.write(data)
+                    f.write('\0' * _Padding(len(data)))
+            else:
+                f.write(struct.pack('<I', sum(len(data) for data in face_data)))
+                for data in face_data:
+                    f.write(data)
+            f.write('\0' * _Padding(f.tell()))
+
+# Write a single-image KTX file strip by strip, WriteRows appends Image2D strips
+# from top to bottom (aligned to block rows) and must cover the whole image
+class KTXStreamWriter(object):
+
+    def __init__(self, filepath, width, height, internalformat):
+        self.filepath = filepath
+        self.internalformat = internalformat
+        (bwidth, bheight) = OGLCommon.GetBlockDimension(internalformat)
+        row_sizes = _GetRowSizes(width, internalformat)
+        block_row_size = row_sizes[1] if row_sizes else OGLCommon.GetImageSize(width, bheight, internalformat)
+        self.remaining = block_row_size * ((height + bheight - 1) // bheight)
+        self.f = open(filepath, 'wb')
+        _WriteHeader(self.f, width, height, internalformat, 0, 1, 1, '')
+        self.f.write(struct.pack('<I', self.remaining))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def WriteRows(self, image):
+        data = _PadRows(image.ToBytes(), image.width, image.height, self.internalformat)
+        self.f.write(data)
+        self.remaining -= len(data)
+
+    def Close(self):
+        if self.f.closed:
+            return
+        if self.remaining:
+            logger.error('KTX file {0} is missing {1} bytes of image data'.format(self.filepath, self.remaining))
+        self.f.write('\0' * _Padding(self.f.tell()))
+        self.f.close()
@@ -0,0 +1,159 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import OGLCommon
+from OGLCommon import OGLEnum
+from OGLImage import Image2D
+from OGLImageConverter import ConvertMany, SplitTiles, StitchTiles
+from OGLKTXFile import WriteKTXFile
+from UtilCommon import LazyModule
+
+np = LazyModule('numpy')
+
+# Mipmap chain generation. Every level is resampled from the previous one with
+# separable filters kept in floating point (no requantization between levels),
+# sRGB formats are filtered in linear space. Level sizes follow GL rules,
+# max(1, size >> 1), and the filter footprints are computed for the exact
+# scale so odd (non power of two) sizes are weighted correctly.
+
+MIPMAP_FILTERS = ('box', 'kaiser', 'lanczos')
+
+MIPMAP_FORMATS = (
+    OGLEnum.GL_RGB8,
+    OGLEnum.GL_RGBA8,
+    OGLEnum.GL_SRGB8,
+    OGLEnum.GL_SRGB8_ALPHA8,
+)
+
+SRGB_FORMATS = (
+    OGLEnum.GL_SRGB8,
+    OGLEnum.GL_SRGB8_ALPHA8,
+)
+
+# radius in destination pixels of the windowed sinc filters
+FILTER_RADIUS = 3
+KAISER_ALPHA = 4.0
+
+def GetMipmapLevelCount(width, height):
+    return max(width, height).bit_length()
+
+def _KernelWeights(t, mip_filter):
+    inside = np.abs(t) < FILTER_RADIUS
+    if mip_filter == 'lanczos':
+        window = np.sinc(t / FILTER_RADIUS)
+    else:
+        window = np.i0(KAISER_ALPHA * np.sqrt(np.maximum(0, 1 - (t / FILTER_RADIUS) ** 2))) / np.i0(KAISER_ALPHA)
+    return np.where(inside, np.sinc(t) * window, 0)
+
+# (dst_size, taps) source indices and normalized weights along one axis
+def _FilterTaps(src_size, dst_size, mip_filter):
+    scale = float(src_size) / dst_size
+    dst = np.arange(dst_size)
+    if mip_filter == 'box':
+        # overlap of every source pixel with the destination footprint
+        taps = int(np.ceil(scale)) + 1
+        indices = np.floor(dst * scale).astype(np.int64)[:, None] + np.arange(taps)
+        left = np.maximum(indices, (dst * scale)[:, None])
+        right = np.minimum(indices + 1, ((dst + 1) * scale)[:, None])
+        weights = np.maximum(right - left, 0)
+    else:
+        # the kernel is stretched by the scale to act as a low-pass filter
+        center = (dst + 0.5) * scale - 0.5
+        support = FILTER_RADIUS * max(scale, 1.0)
+        taps = int(np.ceil(2 * support)) + 1
+        indices = np.floor(center - support).astype(np.int64)[:, None] + np.arange(1, taps + 1)
+        weights = _KernelWeights((indices - center[:, None]) / max(scale, 1.0), mip_filter)
+    weights = weights / weights.sum(axis=1)[:, None]
+    return np.clip(indices, 0, src_size - 1), weights.astype(np.float32)
+
+def _Resample(pixels, dst_width, dst_height, mip_filter):
+    (indices, weights) = _FilterTaps(pixels.shape[1], dst_width, mip_filter)
+    rows = np.zeros((pixels.shape[0], dst_width, pixels.shape[2]), dtype=np.float32)
+    for tap in range(indices.shape[1]):
+        rows += pixels[:, indices[:, tap], :] * weights[None, :, tap, None]
+
+    (indices, weights) = _FilterTaps(pixels.shape[0], dst_height, mip_filter)
+    result = np.zeros((dst_height, dst_width, pixels.shape[2]), dtype=np.float32)
+    for tap in range(indices.shape[1]):
+        result += rows[indices[:, tap], :, :] * weights[:, tap, None, None]
+    return result
+
+# values stay on the 0-255 scale so box averages of linear data are exact
+def _ToLinear(pixels, srgb):
+    pixels = pixels.astype(np.float32)
+    if srgb:
+        color = pixels[:, :, :3] / 255
+        pixels[:, :, :3] = np.where(color > 0.04045,
+            np.power((color + 0.055) / 1.055, 2.4), color / 12.92) * 255
+    return pixels
+
+def _FromLinear(pixels, srgb):
+    pixels = np.clip(pixels, 0, 255)
+    if srgb:
+        color = pixels[:, :, :3] / 255
+        pixels[:, :, :3] = np.where(color >= 0.0031308,
+            np.power(color, 1 / 2.4) * 1.055 - 0.055, color * 12.92) * 255
+    return np.rint(pixels).astype(np.uint8)
+
+# Return [level 0, level 1, ...] down to 1x1 (or level_count levels),
+# level 0 is the input image itself
+def GenerateMipmaps(image, mip_filter='box', level_count=None):
+    if image.internalformat not in MIPMAP_FORMATS:
+        logger.error('GenerateMipmaps, unexpected internalformat ({0})'.format(OGLEnum.names[image.internalformat]))
+        return []
+    if mip_filter not in MIPMAP_FILTERS:
+        logger.error('GenerateMipmaps, unexpected filter ({0})'.format(mip_filter))
+        return []
+    if image.IsEmpty():
+        return [image]
+
+    width = image.width
+    height = image.height
+    srgb = image.internalformat in SRGB_FORMATS
+    if level_count is None:
+        level_count = GetMipmapLevelCount(width, height)
+
+    levels = [image]
+    pixels = _ToLinear(image.AsArray(), srgb)
+    for level in range(1, level_count):
+        width = max(1, width >> 1)
+        height = max(1, height >> 1)
+        pixels = _Resample(pixels, width, height, mip_filter)
+        data = _FromLinear(pixels, srgb).tostring()
+        levels.append(Image2D(width=width, height=height,
+            internalformat=image.internalformat,
+            dataSize=len(data), data=data))
+    return levels
+
+# Convert all levels on one process pool, with tile_size every level is split
+# into tiles as well so that the large first level does not serialize the work
+def CompressMipmaps(levels, dest_format, workers=None, tile_size=None, **options):
+    if not tile_size or not OGLCommon.IsCompressionFormat(dest_format):
+        return list(ConvertMany(levels, dest_format, workers=workers, **options))
+
+    splits = [SplitTiles(level, dest_format, tile_size) for level in levels]
+    tiles = [tile for (origins, level_tiles) in splits for tile in level_tiles]
+    output_tiles = list(ConvertMany(tiles, dest_format, workers=workers, **options))
+
+    compressed_levels = []
+    start = 0
+    for level, (origins, level_tiles) in zip(levels, splits):
+        compressed_levels.append(StitchTiles(level.width, level.height, dest_format,
+            origins, level_tiles, output_tiles[start:start + len(level_tiles)]))
+        start += len(level_tiles)
+    return compressed_levels
+
+# Generate the mipmap chain of image, convert every level to dest_format
+# concurrently and write them into one KTX file, return True on success
+def SaveMipmapKTX(filepath, image, dest_format=None, mip_filter='box',
+    workers=None, tile_size=None, **options):
+    levels = GenerateMipmaps(image, mip_filter)
+    if not levels:
+        return False
+    if dest_format is not None and dest_format != image.internalformat:
+        levels = CompressMipmaps(levels, dest_format, workers=workers, tile_size=tile_size, **options)
+    if any(level.IsEmpty() for level in levels):
+        logger.error('Failed to convert mipmap levels of {0}'.format(filepath))
+        return False
+    WriteKTXFile(filepath, [[level] for level in levels])
+    return True
@@ -1,8 +1,26 @@
 import unittest
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
 
+import OGLCommon
+import OGLImageConverter
+import UtilExecutor
+import UtilProfile
 from OGLCommon import OGLEnum
 from OGLImage import Image2D
-from OGLImageConverter import Convert
+from OGLImageConverter import Convert, ConvertMany, ConvertKTXFile, ConvertAsync
+from OGLImageIO import SaveImage, LoadImage
+from OGLKTXFile import ReadKTXFile, WriteKTXFile
+from OGLMipmap import GenerateMipmaps, SaveMipmapKTX
+from UtilExecutor import RunTool, ScratchDirectory, Job, SetStagingBackend
+from UtilCache import ConversionCache
+from UtilProfile import AddCallback, RemoveCallback, GetCounters, ResetCounters, RecordConversion
+from UtilCommon import Delete
+from BenchmarkStartup import MeasureImportTime
+from BenchmarkConverters import RunBenchmarks, CompareResults
 
 class TestImage2D(unittest.TestCase):
 
@@ -15,6 +33,36 @@ class TestImage2D(unittest.TestCase):
         self.assertEqual(str(im),
             "Image2D : dimension(2x2), internalformat(GL_RGB8), dataSize(12)")
 
+class TestImage2DBuffers(unittest.TestCase):
+
+    def test_Slots(self):
+        image = Image2D()
+        self.assertFalse(hasattr(image, '__dict__'))
+        self.assertRaises(AttributeError, setattr, image, 'depth', 1)
+
+    def test_AsArray(self):
+        data = bytearray('0102030405060708090A0B0C'.decode('hex'))
+        image = Image2D(2, 2, internalformat=OGLEnum.GL_RGB8, dataSize=len(data), data=data)
+        array = image.AsArray()
+        self.assertEqual(array.shape, (2, 2, 3))
+        array[1, 1, 2] = 0xFF
+        self.assertEqual(data[11], 0xFF)
+
+    def test_FromArray(self):
+        image = Image2D(2, 1, internalformat=OGLEnum.GL_RGB565, dataSize=4, data='\x00\xf8\xe0\x07')
+        array = image.AsArray()
+        self.assertEqual(array.shape, (1, 2, 1))
+        copy_image = Image2D.FromArray(array, OGLEnum.GL_RGB565)
+        self.assertEqual((copy_image.width, copy_image.height, copy_image.dataSize), (2, 1, 4))
+        self.assertTrue(copy_image.data is array)
+        self.assertEqual(copy_image.ToBytes(), image.data)
+
+    def test_ConvertBuffers(self):
+        for data in (bytearray('\x10\x20\x30'), memoryview('\x10\x20\x30'), buffer('\x10\x20\x30')):
+            rgba_image = Convert(Image2D(1, 1, internalformat=OGLEnum.GL_RGB8,
+                dataSize=3, data=data), OGLEnum.GL_RGBA8)
+            self.assertEqual(rgba_image.data, '\x10\x20\x30\xff')
+
 class TestUncompressionConversion(unittest.TestCase):
 
     def test_RGB8_RGBA8(self):
@@ -122,6 +170,477 @@ class TestUncompressionConversion(unittest.TestCase):
         self.assertTrue(not rgb8_image.IsEmpty())
         self.assertEqual(rgb8_image.data, rgb8_data)
 
+    def test_RGBA8_SRGB8_ALPHA8(self):
+        empty_image = Image2D(2, 1, internalformat=OGLEnum.GL_RGBA8, dataSize=8)
+        output = Convert(empty_image, OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(output.width, 2)
+        self.assertEqual(output.height, 1)
+        self.assertEqual(output.internalformat, OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(output.dataSize, 8)
+        self.assertTrue(output.IsEmpty())
+
+        srgb8_alpha8_data = 'FE0CEF8000009F90'.decode('hex')
+        rgba8_data = 'FF01DE8000005990'.decode('hex')
+        srgb8_alpha8_image = Convert(Image2D(2, 1,
+            internalformat=OGLEnum.GL_RGBA8, dataSize=len(rgba8_data), data=rgba8_data),
+            OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(srgb8_alpha8_image.width, 2)
+        self.assertEqual(srgb8_alpha8_image.height, 1)
+        self.assertEqual(srgb8_alpha8_image.internalformat, OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(srgb8_alpha8_image.dataSize, len(srgb8_alpha8_data))
+        self.assertTrue(not srgb8_alpha8_image.IsEmpty())
+        self.assertEqual(srgb8_alpha8_image.data, srgb8_alpha8_data)
+
+    def test_SRGB8_ALPHA8_RGBA8(self):
+        empty_image = Image2D(2, 1, internalformat=OGLEnum.GL_SRGB8_ALPHA8, dataSize=8)
+        output = Convert(empty_image, OGLEnum.GL_RGBA8)
+        self.assertEqual(output.width, 2)
+        self.assertEqual(output.height, 1)
+        self.assertEqual(output.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(output.dataSize, 8)
+        self.assertTrue(output.IsEmpty())
+
+        srgb8_alpha8_data = 'FF0FF080000AA010'.decode('hex')
+        rgba8_data = 'FF01DE8000005910'.decode('hex')
+        rgba8_image = Convert(Image2D(2, 1,
+            internalformat=OGLEnum.GL_SRGB8_ALPHA8, dataSize=len(srgb8_alpha8_data), data=srgb8_alpha8_data),
+            OGLEnum.GL_RGBA8)
+        self.assertEqual(rgba8_image.width, 2)
+        self.assertEqual(rgba8_image.height, 1)
+        self.assertEqual(rgba8_image.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(rgba8_image.dataSize, len(rgba8_data))
+        self.assertTrue(not rgba8_image.IsEmpty())
+        self.assertEqual(rgba8_image.data, rgba8_data)
+
+class TestStartup(unittest.TestCase):
+
+    def test_NoHeavyImports(self):
+        result = MeasureImportTime('OGLImageConverter', repeat=1)
+        self.assertEqual(result['heavy_modules_loaded'], [])
+
+class TestBenchmarkConverters(unittest.TestCase):
+
+    def test_RunBenchmarks(self):
+        results = RunBenchmarks(sizes=(16,), contents=('solid',), repeat=1,
+            edges=['GL_RGB8 -> GL_RGBA8'])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['edge'], 'GL_RGB8 -> GL_RGBA8')
+        self.assertTrue(results[0]['megapixels_per_second'] > 0)
+        self.assertEqual(CompareResults(results, results), [])
+
+        slower = dict(results[0], megapixels_per_second=results[0]['megapixels_per_second'] / 2)
+        regressions = CompareResults([slower], results)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0][1][0].startswith('throughput'))
+
+    def test_EffortVariants(self):
+        results = RunBenchmarks(sizes=(16,), contents=('gradient',), repeat=1,
+            edges=['GL_RGB8 -> GL_ETC1_RGB8_OES'])
+        self.assertEqual([result['effort'] for result in results], ['default', 'fast', 'quality'])
+        for result in results[1:]:
+            self.assertFalse('skipped' in result)
+
+        # a regression of one level is not hidden by the other levels
+        slower = [dict(result, megapixels_per_second=result['megapixels_per_second'] / 2)
+            if result['effort'] == 'quality' else result for result in results]
+        regressions = CompareResults(slower, results)
+        self.assertEqual([case['effort'] for case, reasons in regressions], ['quality'])
+
+class TestMappedLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        Delete(self.directory)
+
+    def _load(self, filename, image):
+        filepath = os.path.join(self.directory, filename)
+        SaveImage(filepath, image)
+        loaded_image = LoadImage(filepath, use_mmap=True)
+        self.assertEqual(loaded_image.width, image.width)
+        self.assertEqual(loaded_image.height, image.height)
+        self.assertEqual(loaded_image.internalformat, image.internalformat)
+        self.assertEqual(loaded_image.dataSize, image.dataSize)
+        self.assertEqual(str(loaded_image.data), image.data)
+        return loaded_image
+
+    def test_KTX(self):
+        etc_data = '7B7B7BFD111E333F'.decode('hex')
+        etc_image = self._load('etc1.ktx', Image2D(2, 2,
+            internalformat=OGLEnum.GL_ETC1_RGB8_OES, dataSize=len(etc_data), data=etc_data))
+        raw_image = Convert(etc_image, OGLEnum.GL_RGB8)
+        self.assertEqual(raw_image.data, 'FFFFFF000000000000FFFFFF'.decode('hex'))
+
+    def test_ASTC(self):
+        astc_data = 'FCFDFFFFFFFFFFFFFFFF80800000FFFF'.decode('hex')
+        astc_image = self._load('void.astc', Image2D(6, 6,
+            internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_6x6_KHR, dataSize=len(astc_data), data=astc_data))
+        raw_image = Convert(astc_image, OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.data, 'FF8000FF'.decode('hex') * 36)
+
+    def test_ASTCWidth(self):
+        astc_data = 'FCFDFFFFFFFFFFFFFFFF80800000FFFF'.decode('hex') * 50
+        self._load('wide.astc', Image2D(300, 1,
+            internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_6x6_KHR, dataSize=len(astc_data), data=astc_data))
+
+class TestKTXFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, 'texture.ktx')
+
+    def tearDown(self):
+        Delete(self.directory)
+
+    def _image(self, width, height, value):
+        data = chr(value) * (width * height * 3)
+        return Image2D(width, height, internalformat=OGLEnum.GL_RGB8,
+            dataSize=len(data), data=data)
+
+    def test_MipmapArray(self):
+        levels = [[self._image(max(1, 6 >> level), max(1, 3 >> level), level * 16 + layer)
+            for layer in range(2)] for level in range(3)]
+        WriteKTXFile(self.filepath, levels, array_elements=2,
+            key_value_data={'KTXorientation' : 'S=r,T=d\0'})
+        ktx_file = ReadKTXFile(self.filepath)
+        self.assertEqual(ktx_file.GetLevelCount(), 3)
+        self.assertEqual(ktx_file.GetLayerCount(), 2)
+        self.assertEqual(ktx_file.key_value_data['KTXorientation'], 'S=r,T=d\0')
+        for level, images in enumerate(levels):
+            for layer, image in enumerate(images):
+                loaded_image = ktx_file.GetImage(level, layer)
+                self.assertEqual((loaded_image.width, loaded_image.height), (image.width, image.height))
+                self.assertEqual(loaded_image.data, image.data)
+
+    def test_CubeMap(self):
+        levels = [[self._image(1, 1, face) for face in range(6)]]
+        WriteKTXFile(self.filepath, levels, faces=6)
+        ktx_file = ReadKTXFile(self.filepath)
+        self.assertEqual(ktx_file.numberOfFaces, 6)
+        for face in range(6):
+            self.assertEqual(ktx_file.GetImage(face=face).data, chr(face) * 3)
+        self.assertTrue(ktx_file.GetImage(level=1).IsEmpty())
+
+class TestStreamingConversion(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.src_filepath = os.path.join(self.directory, 'src.ktx')
+        self.dst_filepath = os.path.join(self.directory, 'dst.ktx')
+
+    def tearDown(self):
+        Delete(self.directory)
+
+    def _convert(self, image, dest_format, strip_height, **options):
+        WriteKTXFile(self.src_filepath, [[image]])
+        self.assertTrue(ConvertKTXFile(self.src_filepath, self.dst_filepath,
+            dest_format, strip_height, **options))
+        output_image = ReadKTXFile(self.dst_filepath).GetImage()
+        self.assertEqual(output_image.data, Convert(image, dest_format, **options).data)
+
+    def test_RGB8_RGB565(self):
+        uncom_data = ''.join(chr(i % 251) for i in range(5 * 7 * 3))
+        self._convert(Image2D(5, 7, internalformat=OGLEnum.GL_RGB8,
+            dataSize=len(uncom_data), data=uncom_data), OGLEnum.GL_RGB565, 2)
+
+    def test_RGB8ToETC1(self):
+        uncom_data = ''.join(chr(i % 251) for i in range(9 * 10 * 3))
+        self._convert(Image2D(9, 10, internalformat=OGLEnum.GL_RGB8,
+            dataSize=len(uncom_data), data=uncom_data), OGLEnum.GL_ETC1_RGB8_OES, 3, etc_effort='fast')
+
+class TestMipmap(unittest.TestCase):
+
+    def test_Box(self):
+        uncom_data = '00000000' '04080C10' '10203040' '20406080'.decode('hex')
+        levels = GenerateMipmaps(Image2D(2, 2, internalformat=OGLEnum.GL_RGBA8,
+            dataSize=len(uncom_data), data=uncom_data))
+        self.assertEqual(len(levels), 2)
+        self.assertEqual((levels[1].width, levels[1].height), (1, 1))
+        self.assertEqual(levels[1].data, '0D1A2734'.decode('hex'))
+
+    def test_NonPowerOfTwo(self):
+        uncom_data = '\x4d' * (7 * 5 * 3)
+        for mip_filter in ('box', 'kaiser', 'lanczos'):
+            levels = GenerateMipmaps(Image2D(7, 5, internalformat=OGLEnum.GL_RGB8,
+                dataSize=len(uncom_data), data=uncom_data), mip_filter)
+            self.assertEqual([(level.width, level.height) for level in levels],
+                [(7, 5), (3, 2), (1, 1)])
+            for level in levels:
+                self.assertEqual(level.data, '\x4d' * (level.width * level.height * 3))
+
+    def test_SRGB(self):
+        # black and white average to linear 0.5, which is 0xBC in sRGB
+        uncom_data = '000000FFFFFF'.decode('hex')
+        levels = GenerateMipmaps(Image2D(2, 1, internalformat=OGLEnum.GL_SRGB8,
+            dataSize=len(uncom_data), data=uncom_data))
+        self.assertEqual(levels[1].data, 'BCBCBC'.decode('hex'))
+
+    def test_SaveMipmapKTX(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filepath = os.path.join(directory, 'mipmap.ktx')
+            uncom_data = ''.join(chr(i % 256) for i in range(9 * 6 * 3))
+            self.assertTrue(SaveMipmapKTX(filepath, Image2D(9, 6, internalformat=OGLEnum.GL_RGB8,
+                dataSize=len(uncom_data), data=uncom_data), OGLEnum.GL_ETC1_RGB8_OES,
+                workers=2, etc_effort='fast'))
+            ktx_file = ReadKTXFile(filepath)
+            self.assertEqual(ktx_file.GetLevelCount(), 4)
+            self.assertEqual(ktx_file.GetImage(3).dataSize, 8)
+        finally:
+            Delete(directory)
+
+class TestConversionRoute(unittest.TestCase):
+
+    def test_MultiHop(self):
+        rgba_image = Convert(Image2D(1, 1, internalformat=OGLEnum.GL_RGB565,
+            dataSize=2, data='\xff\xff'), OGLEnum.GL_RGBA8)
+        self.assertEqual(rgba_image.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(rgba_image.data, '\xff\xff\xff\xff')
+
+    def test_FusedMatchesHops(self):
+        # every RGB565 value, fused through a table
+        data = ''.join(chr(i & 0xFF) + chr(i >> 8) for i in range(0x10000))
+        rgb565_image = Image2D(256, 256, internalformat=OGLEnum.GL_RGB565,
+            dataSize=len(data), data=data)
+        srgb_image = Convert(Convert(rgb565_image, OGLEnum.GL_RGB8), OGLEnum.GL_SRGB8)
+        self.assertEqual(Convert(rgb565_image, OGLEnum.GL_SRGB8).data, srgb_image.data)
+        # chained kernels
+        srgb_alpha_image = Convert(Convert(srgb_image, OGLEnum.GL_RGB8),
+            OGLEnum.GL_RGBA8)
+        srgb_alpha_image = Convert(srgb_alpha_image, OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(Convert(srgb_image, OGLEnum.GL_SRGB8_ALPHA8).data, srgb_alpha_image.data)
+
+    def test_NoRoute(self):
+        image = Convert(Image2D(1, 1, internalformat=OGLEnum.GL_RGBA4,
+            dataSize=2, data='\xff\xff'), OGLEnum.GL_RGB8)
+        self.assertTrue(image.IsEmpty())
+        self.assertEqual(image.internalformat, OGLEnum.GL_NONE)
+
+class TestConvertMany(unittest.TestCase):
+
+    def test_RGB8_RGBA8(self):
+        images = [Image2D(1, 1, internalformat=OGLEnum.GL_RGB8,
+            dataSize=3, data=chr(i) * 3) for i in range(5)]
+        for workers in (1, 2):
+            rgba_images = list(ConvertMany(images, OGLEnum.GL_RGBA8, workers=workers))
+            self.assertEqual(len(rgba_images), len(images))
+            for i, rgba_image in enumerate(rgba_images):
+                self.assertEqual(rgba_image.internalformat, OGLEnum.GL_RGBA8)
+                self.assertEqual(rgba_image.data, chr(i) * 3 + '\xff')
+
+    def test_ConcurrentBatches(self):
+        batches = [[Image2D(1, 1, internalformat=OGLEnum.GL_RGB8,
+            dataSize=3, data=chr(b * 16 + i) * 3) for i in range(4)] for b in range(4)]
+        results = [None] * len(batches)
+        def Run(b):
+            results[b] = list(ConvertMany(batches[b], OGLEnum.GL_RGBA8, workers=2, cache=None))
+        threads = [threading.Thread(target=Run, args=(b, )) for b in range(len(batches))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for b, rgba_images in enumerate(results):
+            self.assertEqual([image.data for image in rgba_images],
+                [chr(b * 16 + i) * 3 + '\xff' for i in range(4)])
+
+    def test_TileSizeIgnored(self):
+        images = [Image2D(8, 8, internalformat=OGLEnum.GL_RGB8,
+            dataSize=192, data=''.join(chr((i * 31 + j * 7) & 0xFF) for j in range(192))) for i in range(3)]
+        etc_images = list(ConvertMany(images, OGLEnum.GL_ETC1_RGB8_OES, workers=2,
+            etc_effort='fast', tile_size=4, cache=None))
+        for image, etc_image in zip(images, etc_images):
+            self.assertEqual(etc_image.data,
+                Convert(image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast', cache=None).data)
+
+def _ConvertTiledInWorker(image):
+    return Convert(image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast', tile_size=4, cache=None)
+
+class TestNestedConversion(unittest.TestCase):
+
+    # tiled conversions pick one worker per CPU, pretend there are several
+    def setUp(self):
+        self.cpu_count = multiprocessing.cpu_count
+        multiprocessing.cpu_count = lambda : 4
+
+    def tearDown(self):
+        multiprocessing.cpu_count = self.cpu_count
+
+    def test_TiledInPoolWorker(self):
+        images = [Image2D(8, 8, internalformat=OGLEnum.GL_RGB8,
+            dataSize=192, data=''.join(chr((i * 31 + j * 7) & 0xFF) for j in range(192))) for i in range(3)]
+        pool = multiprocessing.Pool(2)
+        try:
+            etc_images = pool.map(_ConvertTiledInWorker, images)
+        finally:
+            pool.terminate()
+        for image, etc_image in zip(images, etc_images):
+            self.assertEqual(etc_image.data,
+                Convert(image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast', cache=None).data)
+
+class TestProfile(unittest.TestCase):
+
+    def setUp(self):
+        ResetCounters()
+        self.records = []
+        AddCallback(self.records.append)
+
+    def tearDown(self):
+        RemoveCallback(self.records.append)
+
+    def test_Conversion(self):
+        Convert(Image2D(1, 1, internalformat=OGLEnum.GL_RGB565,
+            dataSize=2, data='\xff\xff'), OGLEnum.GL_RGBA8)
+        path = [OGLEnum.GL_RGB565, OGLEnum.GL_RGB8, OGLEnum.GL_RGBA8]
+        self.assertEqual(len(self.records), 1)
+        self.assertEqual(self.records[0]['path'], path)
+        self.assertEqual((self.records[0]['bytes_in'], self.records[0]['bytes_out']), (2, 4))
+        counters = GetCounters()
+        self.assertEqual(counters['routes'], {tuple(path) : 1})
+        self.assertEqual(counters['edges'][(OGLEnum.GL_RGB565, OGLEnum.GL_RGBA8)]['calls'], 1)
+
+    def test_ToolStages(self):
+        with RecordConversion(OGLEnum.GL_RGB8, OGLEnum.GL_RGBA8, 0) as record:
+            RunTool('true', [])
+        self.assertTrue(record['stages']['spawn'] > 0)
+        self.assertTrue(record['stages']['tool'] > 0)
+        self.assertEqual(self.records, [record])
+
+    @unittest.skipUnless(UtilProfile.THREAD_CPU_TIME, 'no thread CPU time on this platform')
+    def test_ThreadCPUTime(self):
+        stop = []
+
+        def _burn():
+            while not stop:
+                pass
+
+        thread = threading.Thread(target=_burn)
+        thread.start()
+        try:
+            with RecordConversion(OGLEnum.GL_RGB8, OGLEnum.GL_RGBA8, 0) as record:
+                time.sleep(0.3)
+        finally:
+            stop.append(True)
+            thread.join()
+        self.assertTrue(record['cpu_seconds'] < 0.1)
+
+class TestConvertAsync(unittest.TestCase):
+
+    def test_RGB8_RGBA8(self):
+        done = []
+        future = ConvertAsync(Image2D(1, 1, internalformat=OGLEnum.GL_RGB8,
+            dataSize=3, data='\x10\x20\x30'), OGLEnum.GL_RGBA8, callback=done.append)
+        rgba_image = future.Result(10)
+        self.assertTrue(future.IsDone())
+        self.assertEqual(rgba_image.data, '\x10\x20\x30\xff')
+        self.assertEqual(done, [future])
+
+    def test_CancelTool(self):
+        job = Job()
+        results = []
+
+        def _run():
+            with job.Running():
+                results.append(RunTool('sleep', ['10'], timeout=None))
+
+        start = time.time()
+        thread = threading.Thread(target=_run)
+        thread.start()
+        time.sleep(0.2)
+        job.Cancel()
+        thread.join(5)
+        self.assertEqual(results, [False])
+        self.assertTrue(time.time() - start < 5)
+
+class TestExecutor(unittest.TestCase):
+
+    def test_ScratchDirectory(self):
+        with ScratchDirectory() as first_dir, ScratchDirectory() as second_dir:
+            self.assertNotEqual(first_dir, second_dir)
+            self.assertTrue(os.path.isdir(first_dir))
+        self.assertFalse(os.path.exists(first_dir))
+        self.assertFalse(os.path.exists(second_dir))
+
+    def test_StagingBackend(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for backend, parent in (('disk', tempfile.gettempdir()), (directory, directory)):
+                SetStagingBackend(backend)
+                with ScratchDirectory() as scratch_dir:
+                    self.assertEqual(os.path.dirname(scratch_dir), parent)
+        finally:
+            SetStagingBackend('memory')
+            Delete(directory)
+        if os.access('/dev/shm', os.W_OK):
+            with ScratchDirectory() as scratch_dir:
+                self.assertEqual(os.path.dirname(scratch_dir), '/dev/shm')
+
+    def test_RunTool(self):
+        self.assertTrue(RunTool('true', []))
+        self.assertFalse(RunTool('false', []))
+        self.assertFalse(RunTool('sleep', ['10'], timeout=0.1))
+        self.assertFalse(RunTool('nonexistent-tool', []))
+
+class TestToolFailure(unittest.TestCase):
+
+    # a stub astcenc writing a valid .astc file, then hanging until it is killed
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        astc_data = 'FCFDFFFFFFFFFFFF2020404060608080'.decode('hex')
+        output_path = os.path.join(self.directory, 'output.astc')
+        SaveImage(output_path, Image2D(4, 4, internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR,
+            dataSize=len(astc_data), data=astc_data))
+        tool_path = os.path.join(self.directory, OGLImageConverter.ASTCENC_NAME)
+        with open(tool_path, 'w') as f:
+            f.write('#!/bin/sh\ncp "{0}" "$3"\nexec sleep 10\n'.format(output_path))
+        os.chmod(tool_path, 0755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.directory + os.pathsep + self.path
+        UtilExecutor._tool_paths.clear()
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        UtilExecutor._tool_paths.clear()
+        Delete(self.directory)
+
+    def test_Timeout(self):
+        raw_data = ''.join(chr((i * 37 + 11) & 0xFF) for i in range(64))
+        start = time.time()
+        astc_image = Convert(Image2D(4, 4, internalformat=OGLEnum.GL_RGBA8, dataSize=len(raw_data), data=raw_data),
+            OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR, timeout=0.5, cache=None)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(astc_image.internalformat, OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR)
+        self.assertEqual(astc_image.dataSize, 16)
+        self.assertTrue(astc_image.IsEmpty())
+
+class TestConversionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        Delete(self.directory)
+
+    def test_HitAndMiss(self):
+        cache = ConversionCache(self.directory)
+        image = Image2D(1, 1, internalformat=OGLEnum.GL_RGB8, dataSize=3, data='\x10\x20\x30')
+        first_image = Convert(image, OGLEnum.GL_RGBA8, cache=cache)
+        second_image = Convert(image, OGLEnum.GL_RGBA8, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(second_image.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(second_image.data, first_image.data)
+        Convert(image, OGLEnum.GL_RGB565, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_Eviction(self):
+        cache = ConversionCache(self.directory, max_size=100)
+        for i in range(10):
+            data = chr(i) * 48
+            Convert(Image2D(4, 4, internalformat=OGLEnum.GL_RGB8, dataSize=48, data=data),
+                OGLEnum.GL_RGBA8, cache=cache)
+        self.assertTrue(cache.size <= 100)
+        self.assertTrue(cache.evictions > 0)
+
 class TestETCConvertion(unittest.TestCase):
 
     def test_RGB8ToETC1(self):
@@ -243,6 +762,180 @@ class TestETCConvertion(unittest.TestCase):
         self.assertTrue(not raw_image.IsEmpty())
         self.assertEqual(raw_image.data, uncom_data)
 
+class TestETCDecoding(unittest.TestCase):
+
+    def _decode(self, etc_format, etc_data, dest_format, uncom_data):
+        raw_image = Convert(Image2D(2, 2,
+            internalformat=etc_format, dataSize=len(etc_data), data=etc_data),
+            dest_format)
+        self.assertEqual(raw_image.width, 2)
+        self.assertEqual(raw_image.height, 2)
+        self.assertEqual(raw_image.internalformat, dest_format)
+        self.assertEqual(raw_image.dataSize, len(uncom_data))
+        self.assertTrue(not raw_image.IsEmpty())
+        self.assertEqual(raw_image.data, uncom_data)
+
+    def test_ETC1ToRGB8(self):
+        self._decode(OGLEnum.GL_ETC1_RGB8_OES,
+            '7B7B7BFD111E333F'.decode('hex'),
+            OGLEnum.GL_RGB8,
+            'FFFFFF000000000000FFFFFF'.decode('hex'))
+
+    def test_ETC2ToRGB8(self):
+        self._decode(OGLEnum.GL_COMPRESSED_RGB8_ETC2,
+            'FAEE00071110000E'.decode('hex'),
+            OGLEnum.GL_RGB8,
+            'EEEEEE000000101010EEEEEE'.decode('hex'))
+
+    def test_ETC2_ALPHA1ToRGBA8(self):
+        self._decode(OGLEnum.GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2,
+            '0400EEE0001EEEE1'.decode('hex'),
+            OGLEnum.GL_RGBA8,
+            'F1F1F1FF0000000000000000F1F1F1FF'.decode('hex'))
+
+    def test_ETC2_EACToRGBA8(self):
+        self._decode(OGLEnum.GL_COMPRESSED_RGBA8_ETC2_EAC,
+            '87F2E927B6DB6DB6FAEE00071110000E'.decode('hex'),
+            OGLEnum.GL_RGBA8,
+            'EEEEEEFF000000001010100FEEEEEEF0'.decode('hex'))
+
+    def test_SRGB8_ETC2ToSRGB8(self):
+        self._decode(OGLEnum.GL_COMPRESSED_SRGB8_ETC2,
+            'FAEE00071110000E'.decode('hex'),
+            OGLEnum.GL_SRGB8,
+            'EEEEEE000000101010EEEEEE'.decode('hex'))
+
+class TestETCEncoding(unittest.TestCase):
+
+    def _roundtrip(self, src_format, etc_format, uncom_data, effort):
+        etc_image = Convert(Image2D(4, 4,
+            internalformat=src_format, dataSize=len(uncom_data), data=uncom_data),
+            etc_format, etc_effort=effort)
+        self.assertEqual(etc_image.internalformat, etc_format)
+        self.assertEqual(etc_image.dataSize, 8)
+        self.assertTrue(not etc_image.IsEmpty())
+        raw_image = Convert(etc_image, src_format)
+        self.assertEqual(raw_image.internalformat, src_format)
+        return [ord(c) for c in raw_image.data]
+
+    def test_SolidRGB8ToETC1(self):
+        for effort in ('fast', 'quality'):
+            data = self._roundtrip(OGLEnum.GL_RGB8, OGLEnum.GL_ETC1_RGB8_OES,
+                '4080C0'.decode('hex') * 16, effort)
+            for a, b in zip(data, [0x40, 0x80, 0xC0] * 16):
+                self.assertTrue(abs(a - b) <= 8)
+
+    def test_QualityNotWorseThanFast(self):
+        uncom_data = ''.join(chr((i * 97 + 13) % 256) for i in range(16 * 8 * 3))
+        image = Image2D(16, 8, internalformat=OGLEnum.GL_RGB8, dataSize=len(uncom_data), data=uncom_data)
+        for etc_format in (OGLEnum.GL_ETC1_RGB8_OES, OGLEnum.GL_COMPRESSED_RGB8_ETC2):
+            errors = []
+            for effort in ('fast', 'quality'):
+                raw_image = Convert(Convert(image, etc_format, etc_effort=effort, cache=None), OGLEnum.GL_RGB8)
+                errors.append(sum((ord(a) - ord(b)) ** 2 for a, b in zip(raw_image.data, uncom_data)))
+            self.assertTrue(errors[1] <= errors[0])
+
+    def test_GradientRGB8ToETC2(self):
+        uncom_data = ''.join(chr(x * 16) + chr(y * 16) + chr(128)
+            for y in range(4) for x in range(4))
+        for effort in ('fast', 'quality'):
+            data = self._roundtrip(OGLEnum.GL_RGB8, OGLEnum.GL_COMPRESSED_RGB8_ETC2,
+                uncom_data, effort)
+            for a, b in zip(data, [ord(c) for c in uncom_data]):
+                self.assertTrue(abs(a - b) <= 8)
+
+    def test_TiledRGB8ToETC1(self):
+        uncom_data = ''.join(chr((x * 7 + y * 13) % 256) + chr(x * 20) + chr(y * 20)
+            for y in range(10) for x in range(9))
+        image = Image2D(9, 10, internalformat=OGLEnum.GL_RGB8,
+            dataSize=len(uncom_data), data=uncom_data)
+        whole_image = Convert(image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast')
+        tiled_image = Convert(image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast',
+            tile_size=(4, 8), workers=2)
+        self.assertEqual(tiled_image.width, 9)
+        self.assertEqual(tiled_image.height, 10)
+        self.assertEqual(tiled_image.dataSize, whole_image.dataSize)
+        self.assertEqual(tiled_image.data, whole_image.data)
+
+    def test_SRGB8ToSRGB8_ETC2(self):
+        data = self._roundtrip(OGLEnum.GL_SRGB8, OGLEnum.GL_COMPRESSED_SRGB8_ETC2,
+            '204060'.decode('hex') * 16, 'fast')
+        for a, b in zip(data, [0x20, 0x40, 0x60] * 16):
+            self.assertTrue(abs(a - b) <= 8)
+
+class TestBlockPass(unittest.TestCase):
+
+    def test_RGB8ToETC1(self):
+        # written directly, no etcpack needed
+        raw_data = '214263'.decode('hex') * 32
+        etc_image = Convert(Image2D(8, 4,
+            internalformat=OGLEnum.GL_RGB8, dataSize=len(raw_data), data=raw_data),
+            OGLEnum.GL_ETC1_RGB8_OES)
+        self.assertEqual(etc_image.internalformat, OGLEnum.GL_ETC1_RGB8_OES)
+        self.assertEqual(etc_image.ToBytes(), '28486802FFFFFFFF'.decode('hex') * 2)
+        raw_image = Convert(etc_image, OGLEnum.GL_RGB8)
+        self.assertEqual(raw_image.data, raw_data)
+
+    def test_InexactSolidColor(self):
+        # no ETC1 block decodes to 204060, the block is left to the encoder
+        raw_data = '204060'.decode('hex') * 16
+        raw_image = Image2D(4, 4, internalformat=OGLEnum.GL_RGB8, dataSize=len(raw_data), data=raw_data)
+        etc_data = Convert(raw_image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast').ToBytes()
+        self.assertEqual(etc_data, Convert(raw_image, OGLEnum.GL_ETC1_RGB8_OES, etc_effort='fast',
+            solid_blocks=False).ToBytes())
+
+    def test_RGBA8ToRGBA_ASTC_6x6(self):
+        raw_data = '20406080'.decode('hex') * 30
+        astc_image = Convert(Image2D(5, 6,
+            internalformat=OGLEnum.GL_RGBA8, dataSize=len(raw_data), data=raw_data),
+            OGLEnum.GL_COMPRESSED_RGBA_ASTC_6x6_KHR)
+        self.assertEqual(astc_image.ToBytes(), 'FCFDFFFFFFFFFFFF2020404060608080'.decode('hex'))
+        self.assertEqual(Convert(astc_image, OGLEnum.GL_RGBA8).data, raw_data)
+
+    def test_MixedBlocks(self):
+        # the encoder only sees the noisy block, which comes back unchanged
+        raw_data = ''.join(chr((i * 37) & 0xFF) for i in range(8 * 4 * 3))
+        raw_data = ''.join(raw_data[y * 24:y * 24 + 12] + '\x80' * 12 for y in range(4))
+        raw_image = Image2D(8, 4, internalformat=OGLEnum.GL_RGB8, dataSize=len(raw_data), data=raw_data)
+        etc_data = Convert(raw_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='quality').ToBytes()
+        reference_data = Convert(raw_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='quality',
+            solid_blocks=False).ToBytes()
+        self.assertEqual(etc_data[:8], reference_data[:8])
+        solid_image = Convert(Image2D(4, 4, internalformat=OGLEnum.GL_COMPRESSED_RGB8_ETC2,
+            dataSize=8, data=etc_data[8:]), OGLEnum.GL_RGB8)
+        self.assertEqual(solid_image.data, '\x80' * 48)
+
+    def test_RepeatedBlocks(self):
+        # two distinct noisy blocks repeated over 3x2 blocks
+        tiles = [''.join(chr((i * step + 11) & 0xFF) for i in range(48)) for step in (37, 53)]
+        rows = [[tiles[(x + y) % 2][r * 12:(r + 1) * 12] for x in range(3)]
+            for y in range(2) for r in range(4)]
+        raw_data = ''.join(''.join(row) for row in rows)
+        raw_image = Image2D(12, 8, internalformat=OGLEnum.GL_RGB8, dataSize=len(raw_data), data=raw_data)
+        etc_data = Convert(raw_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast').ToBytes()
+        self.assertEqual(etc_data, Convert(raw_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast',
+            dedup_blocks=False).ToBytes())
+        self.assertNotEqual(etc_data[:8], etc_data[8:16])
+        self.assertEqual(etc_data, etc_data[:16] * 3)
+
+    def test_Reencode(self):
+        raw_data = ''.join(chr((i * 37 + 11) & 0xFF) for i in range(12 * 8 * 3))
+        raw_image = Image2D(12, 8, internalformat=OGLEnum.GL_RGB8, dataSize=len(raw_data), data=raw_data)
+        # one pixel of the last block changes
+        new_data = raw_data[:-3] + '\x00\x00\x00'
+        new_image = Image2D(12, 8, internalformat=OGLEnum.GL_RGB8, dataSize=len(new_data), data=new_data)
+        etc_image = Convert(raw_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast')
+        etc_data = Convert(new_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast').ToBytes()
+        self.assertEqual(etc_data, Convert(new_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast',
+            previous=(raw_image, etc_image)).ToBytes())
+        # unchanged blocks are copied from the previous output
+        previous_data = '\xFF' * 40 + etc_image.ToBytes()[40:]
+        previous_image = Image2D(12, 8, internalformat=OGLEnum.GL_COMPRESSED_RGB8_ETC2,
+            dataSize=len(previous_data), data=previous_data)
+        reencoded_data = Convert(new_image, OGLEnum.GL_COMPRESSED_RGB8_ETC2, etc_effort='fast',
+            previous=(raw_image, previous_image)).ToBytes()
+        self.assertEqual(reencoded_data, '\xFF' * 40 + etc_data[40:])
+
 class TestASTCConvertion(unittest.TestCase):
 
     def test_RGBA8ToRGBA_ASTC_4x4(self):
@@ -275,6 +968,128 @@ class TestASTCConvertion(unittest.TestCase):
         self.assertTrue(not raw_image.IsEmpty())
         self.assertEqual(raw_image.data, uncom_data)
 
+    def test_AllFootprints(self):
+        for astc_format in OGLCommon.ASTC_FORMAT_TO_BLOCK_DIMENSION:
+            if OGLCommon.IsASTCSRGBFormat(astc_format):
+                src_format = OGLEnum.GL_SRGB8_ALPHA8
+            else:
+                src_format = OGLEnum.GL_RGBA8
+            empty_image = Image2D(13, 13, internalformat=src_format, dataSize=13 * 13 * 4)
+            output = Convert(empty_image, astc_format)
+            self.assertEqual(output.internalformat, astc_format)
+            self.assertEqual(output.dataSize, OGLCommon.GetImageSize(13, 13, astc_format))
+            self.assertTrue(output.IsEmpty())
+
+            output = Convert(Image2D(13, 13, internalformat=astc_format,
+                dataSize=output.dataSize), src_format)
+            self.assertEqual(output.internalformat, src_format)
+            self.assertEqual(output.dataSize, 13 * 13 * 4)
+
+class TestASTCDecoding(unittest.TestCase):
+
+    def test_RGBA_ASTC_4x4ToRGBA8(self):
+        astc_data = '225045993CF236DCF00B01C0973A15C0'.decode('hex')
+        uncom_data = 'FF1010FF000000000F0F0F0FF0F0F0F0'.decode('hex')
+        raw_image = Convert(Image2D(2, 2,
+            internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_4x4_KHR, dataSize=len(astc_data), data=astc_data),
+            OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.width, 2)
+        self.assertEqual(raw_image.height, 2)
+        self.assertEqual(raw_image.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.dataSize, len(uncom_data))
+        self.assertTrue(not raw_image.IsEmpty())
+        self.assertEqual(raw_image.data, uncom_data)
+
+    def test_RGBA_ASTC_6x6_VoidExtentToRGBA8(self):
+        astc_data = 'FCFDFFFFFFFFFFFFFFFF80800000FFFF'.decode('hex')
+        uncom_data = 'FF8000FF'.decode('hex') * 6
+        raw_image = Convert(Image2D(3, 2,
+            internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_6x6_KHR, dataSize=len(astc_data), data=astc_data),
+            OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.width, 3)
+        self.assertEqual(raw_image.height, 2)
+        self.assertEqual(raw_image.internalformat, OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.dataSize, len(uncom_data))
+        self.assertTrue(not raw_image.IsEmpty())
+        self.assertEqual(raw_image.data, uncom_data)
+
+    def test_SRGB8_ALPHA8_ASTC_6x6_VoidExtentToSRGB8_ALPHA8(self):
+        astc_data = 'FCFDFFFFFFFFFFFFFFFF80800000FFFF'.decode('hex')
+        uncom_data = 'FF8000FF'.decode('hex') * 6
+        raw_image = Convert(Image2D(3, 2,
+            internalformat=OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_6x6_KHR, dataSize=len(astc_data), data=astc_data),
+            OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(raw_image.internalformat, OGLEnum.GL_SRGB8_ALPHA8)
+        self.assertEqual(raw_image.data, uncom_data)
+
+    def test_IllegalBlockToRGBA8(self):
+        astc_data = '00000000000000000000000000000000'.decode('hex')
+        uncom_data = 'FF00FFFF'.decode('hex') * 4
+        raw_image = Convert(Image2D(2, 2,
+            internalformat=OGLEnum.GL_COMPRESSED_RGBA_ASTC_8x8_KHR, dataSize=len(astc_data), data=astc_data),
+            OGLEnum.GL_RGBA8)
+        self.assertEqual(raw_image.data, uncom_data)
+
+    # reference texels below are the output of astcenc (decode_unorm8 mode)
+    def _assertDecodes(self, internalformat, width, height, astc_hex, uncom_hex):
+        astc_data = astc_hex.decode('hex')
+        raw_image = Convert(Image2D(width, height,
+            internalformat=internalformat, dataSize=len(astc_data), data=astc_data),
+            OGLCommon.GetASTCDecodeFormat(internalformat))
+        self.assertEqual(raw_image.data, uncom_hex.decode('hex'))
+
+    def test_RGBA_ASTC_5x4_TwoPartitionsToRGBA8(self):
+        # two partitions, trit weights (3 levels), quint endpoints (40 levels)
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_5x4_KHR, 5, 4, 'D1889031A73D5C2BD12FCF813D0F3D39',
+            'DE2E87E5DE2E87E5EC318FE5F93497E5F93497E5DE2E87E5EC318FE5EC318FE5F93497E5F93497E5'
+            'DE4592D8DE4592D8EC499BD8EC499BD8F94EA4D8DE4592D8EC499BD8EC499BD8F94EA4D8F94EA4D8')
+
+    def test_RGBA_ASTC_5x4_ThreePartitionsToRGBA8(self):
+        # three partitions of RGB scale plus alpha endpoints
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_5x4_KHR, 5, 4, 'C230AA81EB2CB3E4F607AC4E233C6735',
+            '3E2E4DDBDB92B66D4EB7B762BC7D9C79BC7D9C7959426FABBC7D9C796DFFFF927C536792DB92B66D'
+            '926DB6497C5367920F2323009B6881863E2E4DDBDB92B66DBC7D9C793E2E4DDB926DB6492E6B6B30')
+
+    def test_RGBA_ASTC_5x4_DualPlaneToRGBA8(self):
+        # dual plane, quint weights (5 levels), trit endpoints (48 levels)
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_5x4_KHR, 5, 4, '524425D4BCB382C965BE31A74AD0EE04',
+            '0A2618EA0A2D1CE70F2F1EE6152F1EE6152F1EE60A2F1EE60A3622E30F3924E2153924E2153924E2'
+            '0A422ADE0A422ADE0F422ADE15422ADE15422ADE0A4C30D90A4C30D90F4C30D9154C30D9154C30D9')
+
+    def test_RGBA_ASTC_5x4_LuminanceDeltaToRGBA8(self):
+        # four partitions of luminance base+offset endpoints, 4x2 weight grid
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_5x4_KHR, 5, 4, '029A5182737F740DDD9F146003A3666B',
+            'FCFCFCFFFEFEFEFFFEFEFEFFFCFCFCFFFCFCFCFFFCFCFCFFFEFEFEFFFDFDFDFFFCFCFCFFFDFDFDFF'
+            'FCFCFCFFFEFEFEFF292929FF292929FF868686FF292929FF292929FF292929FF717171FF8B8B8BFF')
+
+    def test_RGBA_ASTC_5x4_RGBDeltaToRGBA8(self):
+        # RGB base+offset endpoints, dual plane 5x2 weight grid
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_5x4_KHR, 5, 4, '822453535528E4C72C832ACDACA17CDC',
+            'E21F6AFFD41F6AFFE81B6FFFD41F6AFFDB1874FFE21B6FFFD71D6DFFE21C6DFFD41F6AFFDD1A71FF'
+            'E21874FFD91A71FFDB1E6CFFD41F6AFFE01D6DFFE21579FFDB1874FFD41F6AFFD41F6AFFE21F6AFF')
+
+    def test_RGBA_ASTC_8x6_InfillToRGBA8(self):
+        # 6x4 weight grid infilled to 8x6, trit weights (6 levels)
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_RGBA_ASTC_8x6_KHR, 8, 6, '4381310E4818E9D729BD777F4F6A4900',
+            '610030FF610030FF610030FF610130FF640634FC640634FC650836FB670E39F8630433FD630433FD'
+            '640634FC650936FA660A37FA660B38F9670D39F869133DF5640735FB650936FA660C38F9680F3BF7'
+            '680F3BF768103BF669123DF56B1740F3670C39F868103BF66A133DF56A143EF46A143EF46B1740F2'
+            '6D1B43F06D1C43F06A133DF56B1740F36C1841F26C1941F16D1B43F06E1D44EF6F2046EE6F2046EE'
+            '6E1D44EF6E1D44EF6E1D44EF6E1E45EF712348EC712449EB712449EB712449EB')
+
+    def test_SRGB8_ALPHA8_ASTC_5x5_FourPartitionsToSRGB8_ALPHA8(self):
+        # four partitions of luminance endpoints, quint weights (5 levels)
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x5_KHR, 5, 5, 'F27877202004993F186600AFE6D37325',
+            'C6C6C6FF636363FF5C5C5CFF747474FFF7F7F7FF393939FF888888FFC6C6C6FF424242FFF7F7F7FF'
+            '747474FFF7F7F7FF808080FF252525FFF7F7F7FF848484FFF7F7F7FFA3A3A3FF424242FF636363FF'
+            '080808FFD2D2D2FF808080FF535353FF424242FF')
+
+    def test_SRGB8_ALPHA8_ASTC_5x4_TwoPartitionsToSRGB8_ALPHA8(self):
+        # two partitions of RGBA endpoints
+        self._assertDecodes(OGLEnum.GL_COMPRESSED_SRGB8_ALPHA8_ASTC_5x4_KHR, 5, 4, 'D2489F07D6C7D90A4105A0C0B4DAD809',
+            '00496D6D925B493600496D6D6EA480A4DBFF92DB499292244992922437777689A4D289C06EA480A4'
+            'B74025406E776E2D925B4936925B4936B7402540DB24004900496D6D377776893777768900496D6D')
+
 if __name__ == '__main__':
     import logging
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,116 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import hashlib, os, struct, tempfile
+
+from OGLImage import Image2D
+
+# options that change how a conversion runs but not its result
+NEUTRAL_OPTIONS = ('workers', 'timeout', 'tile_size', 'previous')
+
+# width, height, internalformat, dataSize
+ENTRY_HEADER = struct.Struct('<4I')
+
+# On-disk cache of converted images keyed by the content hash of the input,
+# least recently used entries (by file mtime) are evicted above max_size bytes.
+# Hit and miss counters are per process.
+class ConversionCache(object):
+
+    def __init__(self, directory, max_size=1 << 30):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.size = sum(os.path.getsize(path) for path, mtime in self._Entries())
+
+    def __repr__(self):
+        return 'ConversionCache : directory({0}), size({1}/{2}), hits({3}), misses({4})' \
+            .format(self.directory, self.size, self.max_size, self.hits, self.misses)
+
+    def Key(self, input_image, dest_format, options):
+        h = hashlib.sha1()
+        h.update(struct.pack('<4I', input_image.width, input_image.height,
+            input_image.internalformat, dest_format))
+        h.update(repr(sorted((name, value) for name, value in options.items()
+            if name not in NEUTRAL_OPTIONS)))
+        h.update(input_image.data)
+        return h.hexdigest()
+
+    def Get(self, key):
+        path = self._Path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(ENTRY_HEADER.size)
+                data = f.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+
+        (width, height, internalformat, dataSize) = ENTRY_HEADER.unpack(header)
+        if dataSize != len(data):
+            logger.error('Corrupted cache entry ({0}), ignore it'.format(path))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Image2D(width=width, height=height,
+            internalformat=internalformat,
+            dataSize=dataSize, data=data)
+
+    def Put(self, key, image):
+        path = self._Path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        # write then rename, concurrent writers never expose a partial entry
+        data = image.ToBytes()
+        (fd, temp_path) = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(ENTRY_HEADER.pack(image.width, image.height,
+                image.internalformat, len(data)))
+            f.write(data)
+        os.rename(temp_path, path)
+        self.size += ENTRY_HEADER.size + len(data)
+        if self.size > self.max_size:
+            self._Evict()
+
+    def Clear(self):
+        for path, mtime in self._Entries():
+            os.remove(path)
+        self.size = 0
+
+    def GetStatistics(self):
+        return {'hits' : self.hits, 'misses' : self.misses,
+            'evictions' : self.evictions, 'size' : self.size}
+
+    def _Path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _Entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getmtime(path)
+                except OSError:
+                    pass
+
+    # rescan since other processes may share the directory
+    def _Evict(self):
+        entries = sorted(self._Entries(), key=lambda entry : entry[1])
+        self.size = sum(os.path.getsize(path) for path, mtime in entries)
+        for path, mtime in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                self.size -= os.path.getsize(path)
+                os.remove(path)
+                self.evictions += 1
+                logger.debug('Evict cache entry : {0}'.format(path))
+            except OSError:
+                pass
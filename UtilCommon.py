@@ -1,7 +1,7 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import subprocess, os, shutil
+import importlib, subprocess, os, shutil
 
 def Which(program):
     def is_exe(fpath):
@@ -35,3 +35,18 @@ def Delete(filepath):
         else:
             os.remove(filepath)
             logger.debug('Remove file : {0}'.format(filepath))
+
+# Stand-in for a module that is imported on first attribute access, the module
+# attributes are then copied in so later lookups cost the same as a real module
+class LazyModule(object):
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__dict__['_name'])
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return 'LazyModule : {0}'.format(self.__dict__['_name'])
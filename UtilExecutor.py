@@ -0,0 +1,176 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import contextlib, multiprocessing, os, subprocess, tempfile, threading
+
+from UtilCommon import Which, Delete
+from UtilProfile import MeasureStage
+
+# seconds before an external tool run is killed, None waits forever
+DEFAULT_TIMEOUT = 600
+# external tools running at the same time in this process
+MAX_CONCURRENT_PROCESSES = multiprocessing.cpu_count()
+# RAM-backed (tmpfs) directories tried in order by the 'memory' staging backend
+MEMORY_STAGING_DIRECTORIES = ('/dev/shm', '/run/shm')
+
+_process_slots = threading.BoundedSemaphore(MAX_CONCURRENT_PROCESSES)
+_tool_paths = {}
+_tool_paths_lock = threading.Lock()
+_local = threading.local()
+# staging backend of scratch directories and the directory it resolved to
+_staging = {'backend' : 'memory', 'directory' : None}
+_staging_lock = threading.Lock()
+
+def SetMaxConcurrentProcesses(count):
+    global MAX_CONCURRENT_PROCESSES, _process_slots
+    MAX_CONCURRENT_PROCESSES = max(1, count)
+    _process_slots = threading.BoundedSemaphore(MAX_CONCURRENT_PROCESSES)
+
+# $PATH lookup happens once per tool, missing tools are remembered as None
+def FindTool(program):
+    with _tool_paths_lock:
+        if program not in _tool_paths:
+            _tool_paths[program] = Which(program)
+            logger.debug('Resolve tool {0} : {1}'.format(program, _tool_paths[program]))
+        return _tool_paths[program]
+
+def _Kill(p):
+    try:
+        p.kill()
+    except OSError:
+        pass
+
+# Cancellation of a job, external tools started by RunTool while the job is
+# running in a thread are killed as soon as it is cancelled
+class Job(object):
+
+    def __init__(self):
+        self.cancelled = False
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def Cancel(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        map(_Kill, processes)
+
+    # make the job current in the calling thread
+    @contextlib.contextmanager
+    def Running(self):
+        previous_job = GetCurrentJob()
+        _local.job = self
+        try:
+            yield self
+        finally:
+            _local.job = previous_job
+
+    def _Attach(self, p):
+        with self._lock:
+            self._processes.add(p)
+            cancelled = self.cancelled
+        if cancelled:
+            _Kill(p)
+
+    def _Detach(self, p):
+        with self._lock:
+            self._processes.discard(p)
+
+def GetCurrentJob():
+    return getattr(_local, 'job', None)
+
+def IsCurrentJobCancelled():
+    job = GetCurrentJob()
+    return job is not None and job.cancelled
+
+# Where intermediate files of external tools are staged : 'memory' uses a
+# RAM-backed directory so tools never touch persistent storage (the system
+# temporary directory when there is none), 'disk' the system temporary
+# directory, anything else is taken as the path of a directory to use
+def SetStagingBackend(backend):
+    with _staging_lock:
+        _staging['backend'] = backend
+        _staging['directory'] = None
+
+def GetStagingDirectory():
+    with _staging_lock:
+        if _staging['directory'] is None:
+            _staging['directory'] = _ResolveStagingDirectory(_staging['backend'])
+            logger.debug('Staging directory : {0}'.format(_staging['directory']))
+        return _staging['directory']
+
+def _ResolveStagingDirectory(backend):
+    if backend == 'disk':
+        return tempfile.gettempdir()
+    if backend != 'memory':
+        return backend
+    for directory in MEMORY_STAGING_DIRECTORIES:
+        if os.path.isdir(directory) and os.access(directory, os.W_OK | os.X_OK):
+            return directory
+    logger.warning('Cannot find a RAM-backed directory, stage files in {0}'.format(tempfile.gettempdir()))
+    return tempfile.gettempdir()
+
+# every job gets its own directory for intermediate files in the staging
+# directory, removed on exit
+@contextlib.contextmanager
+def ScratchDirectory(prefix='oglimage_'):
+    path = tempfile.mkdtemp(prefix=prefix, dir=GetStagingDirectory())
+    try:
+        yield path
+    finally:
+        Delete(path)
+
+# run a tool with an argument list (no shell), return True on success,
+# the tool is killed and False returned when the current job is cancelled
+def RunTool(program, args, timeout=DEFAULT_TIMEOUT):
+    tool_path = FindTool(program)
+    if not tool_path:
+        logger.error('Cannot find the specified tool ({0}) in the environment $PATH'.format(program))
+        return False
+
+    command = [tool_path] + list(args)
+    logger.debug('Command : "{0}"'.format(subprocess.list2cmdline(command)))
+    job = GetCurrentJob()
+    timed_out = []
+    process_slots = _process_slots
+    with MeasureStage('queue'):
+        process_slots.acquire()
+    try:
+        if job and job.cancelled:
+            logger.debug('Command cancelled : {0}'.format(program))
+            return False
+        with MeasureStage('spawn'):
+            p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if job:
+            job._Attach(p)
+
+        def _kill():
+            timed_out.append(True)
+            _Kill(p)
+
+        timer = threading.Timer(timeout, _kill) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            with MeasureStage('tool'):
+                output, error = p.communicate()
+        finally:
+            if timer:
+                timer.cancel()
+            if job:
+                job._Detach(p)
+    finally:
+        process_slots.release()
+
+    if job and job.cancelled:
+        logger.debug('Command cancelled : {0}'.format(program))
+        return False
+    map(lambda l : logger.debug(l), output.splitlines())
+    map(lambda l : logger.error(l), error.splitlines())
+    if timed_out:
+        logger.error('Command killed after {0} seconds : {1}'.format(timeout, program))
+        return False
+    if p.returncode:
+        logger.error('Command failed with return code {0} : {1}'.format(p.returncode, program))
+        return False
+    return True
@@ -0,0 +1,141 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import collections, contextlib, os, sys, threading, time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Instrumentation of conversions. Every converter call along a route makes a
+# record passed to the registered callbacks and summed into the counters :
+#   src_format, dst_format   : the edge (or fused run of edges)
+#   path                     : formats along the route chosen by Convert
+#   wall_seconds             : elapsed time of the call
+#   cpu_seconds              : CPU time of the converting thread during the call
+#                              (of the whole process where THREAD_CPU_TIME is False)
+#   subprocess_cpu_seconds   : CPU time of external tools that exited during the
+#                              call, from every thread of the process
+#   bytes_in, bytes_out      : image data sizes
+#   stages                   : seconds spent in each of STAGES
+# Stages break out where the external tool paths spend their time, the rest
+# of wall_seconds is in-process work (encoding, decoding, copying).
+# Records and counters are per process, workers of ConvertMany keep their own.
+# Concurrent conversions (ConvertAsync) only get their own cpu_seconds with
+# THREAD_CPU_TIME, their subprocess_cpu_seconds always overlap.
+
+STAGES = (
+    'io',       # staging image files on disk for external tools
+    'queue',    # waiting for a free external tool process slot
+    'spawn',    # starting external tool processes
+    'tool',     # waiting for external tools to finish
+)
+
+COUNTER_FIELDS = ('calls', 'wall_seconds', 'cpu_seconds', 'subprocess_cpu_seconds',
+    'bytes_in', 'bytes_out') + tuple(stage + '_seconds' for stage in STAGES)
+
+# RUSAGE_THREAD is Linux only and missing from the resource module of Python 2
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', 1 if resource and sys.platform.startswith('linux') else None)
+THREAD_CPU_TIME = RUSAGE_THREAD is not None
+
+_callbacks = []
+_edge_counters = {}
+_route_counters = collections.Counter()
+_counters_lock = threading.Lock()
+_local = threading.local()
+
+# callback(record) is called after every converter call, in the converting thread
+def AddCallback(callback):
+    _callbacks.append(callback)
+
+def RemoveCallback(callback):
+    _callbacks.remove(callback)
+
+# {'edges' : {(src_format, dst_format) : {field : total}},
+#  'routes' : {(format, ...) : conversion count}}
+def GetCounters():
+    with _counters_lock:
+        return {'edges' : dict((edge, dict(counters)) for edge, counters in _edge_counters.items()),
+            'routes' : dict(_route_counters)}
+
+def ResetCounters():
+    with _counters_lock:
+        _edge_counters.clear()
+        _route_counters.clear()
+
+def _CPUSeconds():
+    if THREAD_CPU_TIME:
+        usage = resource.getrusage(RUSAGE_THREAD)
+        return usage.ru_utime + usage.ru_stime
+    times = os.times()
+    return times[0] + times[1]
+
+def _Records():
+    if not hasattr(_local, 'records'):
+        _local.records = []
+    return _local.records
+
+# route of the conversion running in this thread
+@contextlib.contextmanager
+def RecordRoute(path):
+    with _counters_lock:
+        _route_counters[tuple(path)] += 1
+    previous_path = getattr(_local, 'path', None)
+    _local.path = list(path)
+    try:
+        yield
+    finally:
+        _local.path = previous_path
+
+# time spent in a stage is added to the innermost running record
+@contextlib.contextmanager
+def MeasureStage(stage):
+    start = time.time()
+    try:
+        yield
+    finally:
+        records = _Records()
+        if records:
+            records[-1]['stages'][stage] += time.time() - start
+
+# record a converter call, the caller sets record['bytes_out']
+@contextlib.contextmanager
+def RecordConversion(src_format, dst_format, bytes_in):
+    record = {
+        'src_format' : src_format,
+        'dst_format' : dst_format,
+        'path' : getattr(_local, 'path', None) or [src_format, dst_format],
+        'bytes_in' : bytes_in,
+        'bytes_out' : 0,
+        'stages' : dict.fromkeys(STAGES, 0.),
+    }
+    records = _Records()
+    records.append(record)
+    start_cpu = _CPUSeconds()
+    start_times = os.times()
+    start = time.time()
+    try:
+        yield record
+    finally:
+        record['wall_seconds'] = time.time() - start
+        end_times = os.times()
+        record['cpu_seconds'] = _CPUSeconds() - start_cpu
+        record['subprocess_cpu_seconds'] = sum(end_times[2:4]) - sum(start_times[2:4])
+        records.pop()
+        _Publish(record)
+
+def _Publish(record):
+    with _counters_lock:
+        counters = _edge_counters.setdefault((record['src_format'], record['dst_format']),
+            dict.fromkeys(COUNTER_FIELDS, 0))
+        counters['calls'] += 1
+        for field in ('wall_seconds', 'cpu_seconds', 'subprocess_cpu_seconds', 'bytes_in', 'bytes_out'):
+            counters[field] += record[field]
+        for stage in STAGES:
+            counters[stage + '_seconds'] += record['stages'][stage]
+
+    for callback in list(_callbacks):
+        try:
+            callback(record)
+        except Exception:
+            logger.exception('Conversion callback failed : {0}'.format(callback))